@@ -0,0 +1,34 @@
+"""add_activity_log_user_created_index
+
+Revision ID: 9f21c4b7d3a8
+Revises: 58ad51af5479
+Create Date: 2026-08-28 10:42:11.901233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f21c4b7d3a8'
+down_revision: Union[str, Sequence[str], None] = '58ad51af5479'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves WHERE user_id = ? ORDER BY created_at DESC LIMIT n on the
+    # activity-log endpoints
+    op.create_index(
+        "ix_activity_logs_user_created",
+        "activity_logs",
+        ["user_id", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_activity_logs_user_created", table_name="activity_logs")
@@ -0,0 +1,40 @@
+"""partial_index_magic_link_token
+
+Revision ID: b84f6d203c15
+Revises: e7a905b2c461
+Create Date: 2026-08-28 16:02:37.558214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b84f6d203c15'
+down_revision: Union[str, Sequence[str], None] = 'e7a905b2c461'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Replace the full index with a partial one covering only rows that
+    # actually hold an outstanding magic link
+    op.drop_index("ix_users_magic_link_token", table_name="users")
+    op.create_index(
+        "ix_users_magic_link_token",
+        "users",
+        ["magic_link_token"],
+        postgresql_where=sa.text("magic_link_token IS NOT NULL"),
+        sqlite_where=sa.text("magic_link_token IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_users_magic_link_token", table_name="users")
+    op.create_index(
+        "ix_users_magic_link_token", "users", ["magic_link_token"]
+    )
@@ -0,0 +1,45 @@
+"""add_node_api_key_hash
+
+Revision ID: c3d8e1f5a274
+Revises: 9f21c4b7d3a8
+Create Date: 2026-08-28 14:07:42.318864
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8e1f5a274'
+down_revision: Union[str, Sequence[str], None] = '9f21c4b7d3a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("nodes", sa.Column("api_key_hash", sa.String(64)))
+    op.create_index(
+        "ix_nodes_api_key_hash", "nodes", ["api_key_hash"], unique=True
+    )
+
+    # Backfill from the plaintext keys so existing nodes keep
+    # authenticating through the hashed lookup
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.text("SELECT id, api_key FROM nodes WHERE api_key IS NOT NULL")
+    ).fetchall()
+    for node_id, api_key in rows:
+        bind.execute(
+            sa.text("UPDATE nodes SET api_key_hash = :h WHERE id = :i"),
+            {"h": hashlib.sha256(api_key.encode()).hexdigest(), "i": node_id},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_nodes_api_key_hash", table_name="nodes")
+    op.drop_column("nodes", "api_key_hash")
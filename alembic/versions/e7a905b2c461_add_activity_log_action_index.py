@@ -0,0 +1,36 @@
+"""add_activity_log_action_index
+
+Revision ID: e7a905b2c461
+Revises: c3d8e1f5a274
+Create Date: 2026-08-28 15:21:05.472916
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a905b2c461'
+down_revision: Union[str, Sequence[str], None] = 'c3d8e1f5a274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves WHERE user_id = ? AND action = ? ORDER BY created_at DESC
+    # LIMIT n as a backward index range scan
+    op.create_index(
+        "ix_activity_logs_user_action_created",
+        "activity_logs",
+        ["user_id", "action", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_activity_logs_user_action_created", table_name="activity_logs"
+    )
@@ -7,17 +7,39 @@ Each server only syncs its OWN records (filtered by server_id).
 """
 
 import os
-import requests
 import sqlite3
 import json
 import datetime
+import time
 import traceback
-from dotenv import load_dotenv
-import math
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson (C implementation) is markedly faster for the large batch
+# payloads sync_table builds; fall back to stdlib json if unavailable.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Paths
 ENV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
-load_dotenv(ENV_PATH)
+if os.path.exists(ENV_PATH):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_PATH)
+
+# Marker file recording that the remote schema was verified; lets repeat
+# runs skip verify_remote_tables' round-trips for a day.
+SCHEMA_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "zimpricecheck", "d1_schema_ok")
+SCHEMA_CACHE_TTL = 86400
+
+# Transient statuses worth retrying with backoff instead of dropping the
+# batch (pushes are INSERT OR IGNORE, so replays are safe)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+
+# D1 rejects request bodies over ~100kB; batches whose serialized JSON
+# exceeds this are split in half before sending
+MAX_PAYLOAD_BYTES = 80_000
 
 def chunk_list(data, chunk_size):
     """Yield successive chunks from data."""
@@ -43,13 +65,29 @@ class D1Manager:
             "Content-Type": "application/json"
         }
         self.enabled = all([self.account_id, self.api_token, self.database_id])
-        
+
+        # HTTP client is created lazily on the first remote query, so
+        # importing this module stays cheap when D1 is not configured.
+        self._client = None
+
         # Ensure local DB is initialized
         self.init_local_db()
 
     def log(self, message):
         print(f"[D1] {message}")
 
+    def close(self):
+        """Release the pooled HTTP connections."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
     def init_local_db(self):
         """Initialize local SQLite tables if they don't exist."""
         try:
@@ -81,6 +119,13 @@ class D1Manager:
                           email_sent INTEGER,
                           backup_count INTEGER,
                           server_id TEXT)''')
+
+            # Sync watermarks: lets sync_table diff only rows newer than the
+            # last successful push/pull instead of every ID in the table.
+            c.execute('''CREATE TABLE IF NOT EXISTS sync_state
+                         (table_name TEXT PRIMARY KEY,
+                          last_pushed_id INTEGER DEFAULT 0,
+                          last_pulled_id INTEGER DEFAULT 0)''')
             
             # Migration: add server_id if missing (for legacy databases)
             for table in ['backup_log', 's3_archives', 'daily_emails']:
@@ -88,24 +133,59 @@ class D1Manager:
                     c.execute(f"ALTER TABLE {table} ADD COLUMN server_id TEXT")
                 except sqlite3.OperationalError:
                     pass
-            
+
+            # Sync queries filter on server_id and page by id; the composite
+            # index keeps each sync from scanning the whole table
+            for table in ['backup_log', 's3_archives', 'daily_emails']:
+                c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_server_id ON {table}(server_id, id)")
+
             conn.commit()
             conn.close()
         except Exception as e:
             self.log(f"Failed to initialize local DB: {e}")
 
-    def execute_remote(self, sql, params=None):
-        """Execute SQL query on D1."""
+    def _post_query(self, sql, params=None):
+        """POST one query payload to D1; returns the decoded envelope or None."""
         if not self.enabled:
             return None
 
+        # Deferred import: httpx is only needed once D1 is configured.
+        import httpx
+
+        if self._client is None:
+            # One client per manager: keeps the TLS connection alive across
+            # queries and multiplexes them over HTTP/2 where the h2 extra
+            # is installed, instead of a new handshake per request. The
+            # transport retries dropped connections; pool limits are sized
+            # for execute_remote_many's worker cap.
+            limits = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+            try:
+                transport = httpx.HTTPTransport(retries=3, http2=True, limits=limits)
+            except ImportError:
+                transport = httpx.HTTPTransport(retries=3, limits=limits)
+            self._client = httpx.Client(transport=transport, headers=self.headers,
+                                        timeout=30.0)
+
         payload = {"sql": sql, "params": params or []}
 
         try:
-            response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=30)
-            data = response.json()
-            
-            if not response.ok:
+            for attempt in range(MAX_RETRIES):
+                if orjson is not None:
+                    response = self._client.post(self.base_url, content=orjson.dumps(payload))
+                else:
+                    response = self._client.post(self.base_url, json=payload)
+
+                if response.status_code not in RETRYABLE_STATUSES:
+                    break
+                # Rate limit / transient server error: back off and retry
+                time.sleep(0.5 * (2 ** attempt))
+
+            if orjson is not None:
+                data = orjson.loads(response.content)
+            else:
+                data = response.json()
+
+            if response.is_error:
                 # Try to get detailed error from response
                 errors = data.get("errors", [])
                 if errors:
@@ -114,28 +194,75 @@ class D1Manager:
                     error_msg = f"HTTP {response.status_code}"
                 self.log(f"API Error: {error_msg}")
                 return None
-            
+
             if not data.get("success"):
                 error_msg = "; ".join([e.get("message", "") for e in data.get("errors", [])])
                 self.log(f"D1 Error: {error_msg}")
                 return None
-            
-            return data["result"][0]
-        except requests.exceptions.RequestException as e:
+
+            return data
+        except httpx.HTTPError as e:
             self.log(f"Network error: {e}")
             return None
         except Exception as e:
             self.log(f"Query failed: {e}")
             return None
 
+    def execute_remote(self, sql, params=None):
+        """Execute SQL query on D1."""
+        data = self._post_query(sql, params)
+        return data["result"][0] if data else None
+
+    def execute_remote_script(self, sql):
+        """Execute a multi-statement SQL script on D1 in one round-trip.
+
+        D1's query endpoint splits on semicolons; this returns the list of
+        per-statement results, or None on failure.
+        """
+        data = self._post_query(sql)
+        return data["result"] if data else None
+
+    def execute_remote_many(self, statements):
+        """Execute independent (sql, params) statements concurrently.
+
+        Each statement is a D1 round-trip dominated by network latency, so
+        running them through a small thread pool overlaps the waits. The
+        shared httpx client is thread-safe. Returns results in input
+        order; failed statements yield None.
+        """
+        if not self.enabled or not statements:
+            return [None] * len(statements)
+
+        if len(statements) == 1:
+            sql, params = statements[0]
+            return [self.execute_remote(sql, params)]
+
+        with ThreadPoolExecutor(max_workers=min(16, len(statements))) as pool:
+            return list(pool.map(lambda st: self.execute_remote(st[0], st[1]), statements))
+
     def get_local_connection(self):
-        return sqlite3.connect(self.db_file)
+        conn = sqlite3.connect(self.db_file)
+        # WAL + NORMAL sync makes batched writes much cheaper than the
+        # default rollback journal with a full fsync per transaction.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
 
     def verify_remote_tables(self):
         """Ensure remote tables exist with server_id column."""
         if not self.enabled:
             return
 
+        # Remote schema is stable; skip the round-trips if a recent run
+        # already verified it.
+        try:
+            if time.time() - os.path.getmtime(SCHEMA_CACHE_PATH) < SCHEMA_CACHE_TTL:
+                return
+        except OSError:
+            pass
+
+        verified = True
+
         schemas = [
             """CREATE TABLE IF NOT EXISTS backup_log
                (id INTEGER PRIMARY KEY, 
@@ -164,116 +291,281 @@ class D1Manager:
                 server_id TEXT);"""
         ]
         
-        for sql in schemas:
-            self.execute_remote(sql)
-        
+        # All DDL goes out as one script - a single round-trip instead of
+        # one per statement
+        if self.execute_remote_script("\n".join(schemas)) is None:
+            verified = False
+
         # Migration: Add server_id column only if missing
         tables_to_migrate = ["backup_log", "s3_archives", "daily_emails"]
-        for table in tables_to_migrate:
-            # Check if server_id column exists
-            res = self.execute_remote(f"PRAGMA table_info({table})")
-            if res and "results" in res:
-                columns = [row.get("name") for row in res["results"]]
+        pragma_script = "; ".join(f"PRAGMA table_info({t})" for t in tables_to_migrate)
+        pragma_res = self.execute_remote_script(pragma_script)
+
+        if not pragma_res or len(pragma_res) != len(tables_to_migrate):
+            verified = False
+        else:
+            alters = []
+            for table, res in zip(tables_to_migrate, pragma_res):
+                columns = [row.get("name") for row in res.get("results", [])]
                 if "server_id" not in columns:
-                    self.execute_remote(f"ALTER TABLE {table} ADD COLUMN server_id TEXT")
+                    alters.append(f"ALTER TABLE {table} ADD COLUMN server_id TEXT")
                     self.log(f"Added server_id column to {table}")
+            if alters and self.execute_remote_script("; ".join(alters)) is None:
+                verified = False
+
+        if verified:
+            try:
+                os.makedirs(os.path.dirname(SCHEMA_CACHE_PATH), exist_ok=True)
+                with open(SCHEMA_CACHE_PATH, 'w'):
+                    pass
+            except OSError:
+                pass
+
+    def _find_unpushed_ids(self, c, table_name, pk_field, last_pushed_id):
+        """Identify local IDs past the push watermark missing from the remote.
+
+        Hash-bucket reconciliation: both sides digest their IDs into a
+        (count, sum) pair per id%256 bucket, and only buckets whose digests
+        differ are expanded into explicit ID lists. Steady-state syncs
+        therefore transfer O(diff) data instead of every ID.
+        Returns a set of IDs, or None on network error.
+        """
+        local_digests = {}
+        for bucket, count, total in c.execute(
+                f"SELECT {pk_field} % 256, COUNT(*), SUM({pk_field}) FROM {table_name} "
+                f"WHERE (server_id = ? OR server_id IS NULL) AND {pk_field} > ? GROUP BY 1",
+                [self.server_id, last_pushed_id]):
+            local_digests[bucket] = (count, total)
+
+        if not local_digests:
+            return set()
+
+        res = self.execute_remote(
+            f"SELECT {pk_field} % 256 AS b, COUNT(*) AS cnt, SUM({pk_field}) AS total "
+            f"FROM {table_name} WHERE server_id = ? AND {pk_field} > ? GROUP BY b",
+            [self.server_id, last_pushed_id])
+        if res is None:
+            return None
+        remote_digests = {row["b"]: (row["cnt"], row["total"])
+                          for row in res.get("results", [])}
+
+        stale = [b for b, digest in local_digests.items()
+                 if remote_digests.get(b) != digest]
+        if not stale:
+            return set()
+
+        placeholders = ", ".join(["?"] * len(stale))
+        res = self.execute_remote(
+            f"SELECT {pk_field} FROM {table_name} WHERE server_id = ? AND {pk_field} > ? "
+            f"AND {pk_field} % 256 IN ({placeholders})",
+            [self.server_id, last_pushed_id] + stale)
+        if res is None:
+            return None
+        remote_ids = {row[pk_field] for row in res.get("results", [])}
+
+        local_ids = {r[0] for r in c.execute(
+            f"SELECT {pk_field} FROM {table_name} "
+            f"WHERE (server_id = ? OR server_id IS NULL) AND {pk_field} > ? "
+            f"AND {pk_field} % 256 IN ({placeholders})",
+            [self.server_id, last_pushed_id] + stale)}
+
+        return local_ids - remote_ids
+
+    def _append_push_statements(self, statements, batch, sql_prefix,
+                                placeholders, sql_cache, sid_idx):
+        """Build the INSERT statement for a push batch, halving any batch
+        whose serialized payload would blow D1's request-size limit.
+
+        Wide rows (long backup_log details) can exceed the limit well
+        before the bound-parameter cap does, and D1 drops such requests
+        rather than truncating them.
+        """
+        sql = sql_cache.get(len(batch))
+        if sql is None:
+            sql = sql_prefix + ", ".join([placeholders] * len(batch))
+            sql_cache[len(batch)] = sql
+
+        # Rows are already in column order; only server_id is overridden
+        # so pushed records stay tagged to this server
+        params = [
+            self.server_id if i == sid_idx else v
+            for row in batch
+            for i, v in enumerate(row)
+        ]
+
+        payload = {"sql": sql, "params": params}
+        encoded = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode()
+        if len(encoded) > MAX_PAYLOAD_BYTES and len(batch) > 1:
+            mid = len(batch) // 2
+            self._append_push_statements(statements, batch[:mid], sql_prefix,
+                                         placeholders, sql_cache, sid_idx)
+            self._append_push_statements(statements, batch[mid:], sql_prefix,
+                                         placeholders, sql_cache, sid_idx)
+        else:
+            statements.append((sql, params))
+
+    def _get_sync_state(self, c, table_name):
+        """Return (last_pushed_id, last_pulled_id) watermarks for a table."""
+        try:
+            c.execute("SELECT last_pushed_id, last_pulled_id FROM sync_state WHERE table_name = ?",
+                      (table_name,))
+            row = c.fetchone()
+            if row:
+                return row[0] or 0, row[1] or 0
+        except sqlite3.OperationalError:
+            pass
+        return 0, 0
+
+    def _set_sync_state(self, c, table_name, last_pushed_id, last_pulled_id):
+        """Persist sync watermarks after a successful batch."""
+        c.execute("""INSERT OR REPLACE INTO sync_state
+                     (table_name, last_pushed_id, last_pulled_id) VALUES (?, ?, ?)""",
+                  (table_name, last_pushed_id, last_pulled_id))
 
     def sync_table(self, table_name, pk_field="id"):
-        """Sync table filtered by server_id - each server only syncs its own records."""
+        """Sync table filtered by server_id - each server only syncs its own records.
+
+        Uses per-table watermarks (sync_state) so only rows newer than the
+        last successful sync are diffed and transferred, instead of every
+        ID in the table on every run.
+        """
         if not self.enabled:
             return
 
         self.log(f"Syncing {table_name} for server '{self.server_id}'...")
 
-        # 1. Get remote IDs FOR THIS SERVER ONLY
-        remote_res = self.execute_remote(
-            f"SELECT {pk_field} FROM {table_name} WHERE server_id = ?",
-            [self.server_id]
-        )
-        remote_ids = set()
-        if remote_res and "results" in remote_res:
-            for row in remote_res["results"]:
-                remote_ids.add(row[pk_field])
-
-        # 2. Get local records FOR THIS SERVER
         conn = self.get_local_connection()
-        conn.row_factory = sqlite3.Row
         c = conn.cursor()
-        
+
         # Ensure local table has server_id - Handled by init_local_db() but kept for safety
         try:
             c.execute(f"ALTER TABLE {table_name} ADD COLUMN server_id TEXT")
         except sqlite3.OperationalError:
             pass
-        
-        # Select only this server's records
+
+        # Fix the column order up front so plain tuples (cheaper than
+        # sqlite3.Row) can be used with positional access throughout
         try:
-            c.execute(f"SELECT * FROM {table_name} WHERE server_id = ? OR server_id IS NULL", [self.server_id])
-            local_rows = c.fetchall()
-        except sqlite3.OperationalError:
+            columns = [r[1] for r in c.execute(f"PRAGMA table_info({table_name})")]
+            pk_idx = columns.index(pk_field)
+            sid_idx = columns.index('server_id')
+        except (sqlite3.OperationalError, ValueError):
             self.log(f"Local table {table_name} not ready, skipping pull.")
+            conn.close()
             return
-        
-        local_ids = set()
+
+        last_pushed_id, last_pulled_id = self._get_sync_state(c, table_name)
+
+        # 1. Bucket-digest diff: find which local IDs past the push
+        #    watermark the remote is actually missing
+        missing_ids = self._find_unpushed_ids(c, table_name, pk_field, last_pushed_id)
+        if missing_ids is None:
+            self.log(f"Could not diff remote IDs for {table_name}, skipping.")
+            conn.close()
+            return
+
+        # 2. Get local IDs past the pull watermark FOR THIS SERVER (id-only
+        #    query - full rows are materialized only for push candidates)
+        local_ids = {r[0] for r in c.execute(
+            f"SELECT {pk_field} FROM {table_name} WHERE (server_id = ? OR server_id IS NULL) AND {pk_field} > ?",
+            [self.server_id, last_pulled_id])}
+
         rows_to_push = []
-        
-        for row in local_rows:
-            row_id = row[pk_field]
-            local_ids.add(row_id)
-            if row_id not in remote_ids:
-                rows_to_push.append(row)
+        if missing_ids:
+            rows_to_push = [
+                row for row in c.execute(
+                    f"SELECT {', '.join(columns)} FROM {table_name} WHERE (server_id = ? OR server_id IS NULL) AND {pk_field} > ?",
+                    [self.server_id, last_pushed_id])
+                if row[pk_idx] in missing_ids
+            ]
         
         # 3. Push missing to remote (with server_id)
+        push_ok = True
         if rows_to_push:
-            cols_count = len(rows_to_push[0].keys())
-            batch_size = max(1, math.floor(90 / cols_count))
-            
+            cols_count = len(columns)
+            batch_size = max(1, 90 // cols_count)
+
+            placeholders = "(" + ", ".join(["?"] * cols_count) + ")"
+            # OR IGNORE keeps retried batches idempotent on the remote side
+            sql_prefix = f"INSERT OR IGNORE INTO {table_name} ({', '.join(columns)}) VALUES "
+            # Only two batch lengths ever occur (full and final partial),
+            # so cache the assembled statement per length
+            sql_cache = {}
+
             self.log(f"Pushing {len(rows_to_push)} records...")
-            
+
+            statements = []
             for batch in chunk_list(rows_to_push, batch_size):
-                fields = list(batch[0].keys())
-                
-                # Ensure server_id is set
-                if 'server_id' not in fields:
-                    fields.append('server_id')
-                
-                placeholders = "(" + ", ".join(["?"] * len(fields)) + ")"
-                all_placeholders = ", ".join([placeholders] * len(batch))
-                
-                sql = f"INSERT INTO {table_name} ({', '.join(fields)}) VALUES {all_placeholders}"
-                
-                params = []
-                for row in batch:
-                    for f in fields:
-                        if f == 'server_id':
-                            params.append(self.server_id)
-                        else:
-                            params.append(row[f] if f in row.keys() else None)
-                
-                self.execute_remote(sql, params)
-
-        # 4. Pull missing from remote (for THIS SERVER only)
-        missing_local = list(remote_ids - local_ids)
-        
-        if missing_local:
-            self.log(f"Pulling {len(missing_local)} records...")
-            
-            for batch_ids in chunk_list(missing_local, 90):
-                placeholders = ", ".join(["?"] * len(batch_ids))
-                sql = f"SELECT * FROM {table_name} WHERE {pk_field} IN ({placeholders}) AND server_id = ?"
-                
-                res = self.execute_remote(sql, list(batch_ids) + [self.server_id])
-                
-                if res and "results" in res:
-                    for row in res["results"]:
-                        fields = list(row.keys())
-                        values = [row[f] for f in fields]
-                        sql_insert = f"INSERT OR REPLACE INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(['?']*len(fields))})"
-                        try:
-                            c.execute(sql_insert, values)
-                        except Exception as e:
-                            self.log(f"Insert failed: {e}")
-        
+                self._append_push_statements(statements, batch, sql_prefix,
+                                             placeholders, sql_cache, sid_idx)
+
+            # Batches are independent, so overlap their round-trips
+            push_ok = all(res is not None
+                          for res in self.execute_remote_many(statements))
+
+        # 4. Pull missing from remote (for THIS SERVER only), paged past
+        #    the pull watermark instead of shipping explicit ID lists
+        pull_ok = True
+        pulled_rows = []
+        page_size = 500
+        cursor_id = last_pulled_id
+        pulled_max_id = last_pulled_id
+
+        while True:
+            res = self.execute_remote(
+                f"SELECT * FROM {table_name} WHERE server_id = ? AND {pk_field} > ? "
+                f"ORDER BY {pk_field} LIMIT {page_size}",
+                [self.server_id, cursor_id])
+
+            if res is None:
+                pull_ok = False
+                break
+
+            page = res.get("results", [])
+            if not page:
+                break
+
+            pulled_rows.extend(row for row in page if row[pk_field] not in local_ids)
+            cursor_id = page[-1][pk_field]
+            pulled_max_id = max(pulled_max_id, cursor_id)
+
+            if len(page) < page_size:
+                break
+
+        if pulled_rows:
+            self.log(f"Pulling {len(pulled_rows)} records...")
+
+            # Group rows by column signature so each group shares one
+            # prepared statement, then insert them all in one transaction
+            # instead of an fsync-bounded write per row.
+            buckets = {}
+            for row in pulled_rows:
+                buckets.setdefault(tuple(sorted(row.keys())), []).append(row)
+
+            conn.commit()  # close any implicit transaction first
+            conn.execute("BEGIN IMMEDIATE")
+            for fields, bucket in buckets.items():
+                sql_insert = f"INSERT OR REPLACE INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(['?']*len(fields))})"
+                try:
+                    c.executemany(sql_insert, [tuple(row[f] for f in fields) for row in bucket])
+                except Exception as e:
+                    self.log(f"Insert failed: {e}")
+                    pull_ok = False
+
+        # 5. Advance watermarks only for the directions that fully succeeded.
+        #    After a clean push every local row is known to the remote.
+        new_pushed = last_pushed_id
+        if push_ok:
+            row = c.execute(
+                f"SELECT MAX({pk_field}) FROM {table_name} WHERE server_id = ? OR server_id IS NULL",
+                [self.server_id]).fetchone()
+            new_pushed = max(last_pushed_id, row[0] or 0)
+        new_pulled = pulled_max_id if pull_ok else last_pulled_id
+        if new_pushed != last_pushed_id or new_pulled != last_pulled_id:
+            self._set_sync_state(c, table_name,
+                                 max(new_pushed, last_pushed_id),
+                                 max(new_pulled, last_pulled_id))
+
         conn.commit()
         conn.close()
 
@@ -34,21 +34,30 @@ def request_join(master_url, hostname, ip_address):
 def poll_for_approval(master_url, request_id, timeout_minutes=5):
     """
     Poll the Master Server until approved or timeout.
+
+    Polls with exponential backoff (2s growing to 30s) and a conditional
+    GET: once the master sends an ETag, unchanged status comes back as an
+    empty 304 instead of a full response.
     Returns: api_key (str) or None.
     """
     print(f"[*] Waiting for Admin approval (Timeout: {timeout_minutes}m)...")
     start_time = time.time()
-    
+    delay = 2
+    etag = None
+
     while (time.time() - start_time) < (timeout_minutes * 60):
         try:
+            headers = {"If-None-Match": etag} if etag else None
             res = requests.get(
                 f"{master_url}/api/v1/nodes/status/{request_id}",
+                headers=headers,
                 timeout=10
             )
             if res.status_code == 200:
+                etag = res.headers.get("ETag", etag)
                 data = res.json()
                 status = data.get("status")
-                
+
                 if status == "active":
                     api_key = data.get("api_key")
                     if api_key:
@@ -57,15 +66,17 @@ def poll_for_approval(master_url, request_id, timeout_minutes=5):
                 elif status == "blocked":
                     print("\n[!] Request was BLOCKED by Admin.")
                     return None
-                
-            # Wait before retry
+
+            # Still pending (or 304 unchanged): back off before retrying
             sys.stdout.write(".")
             sys.stdout.flush()
-            time.sleep(5)
-            
+            time.sleep(delay)
+            delay = min(delay * 1.5, 30)
+
         except Exception as e:
             print(f"\n[!] Polling error: {e}")
-            time.sleep(10)
-            
+            time.sleep(delay)
+            delay = min(delay * 1.5, 30)
+
     print("\n[!] Timed out waiting for approval.")
     return None
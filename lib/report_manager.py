@@ -13,6 +13,7 @@ import datetime
 import smtplib
 import os
 import pytz
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
@@ -22,6 +23,11 @@ load_dotenv()
 
 DB_FILE = os.getenv("DB_FILE", "backups.db")
 TIMEZONE = "Africa/Harare"
+
+# Timezone objects are constant; resolving them per row dominates
+# format_timestamp when rendering large reports
+UTC_ZONE = pytz.utc
+LOCAL_ZONE = pytz.timezone(TIMEZONE)
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USER = os.getenv("SMTP_USER")
@@ -29,88 +35,149 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 SMTP_SENDER_EMAIL = os.getenv("SMTP_SENDER_EMAIL", "business@zimpricecheck.com")
 
 
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+# Static report markup built once at import instead of per call
+_HTML_HEADER = """
+    <html>
+    <head>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        h2 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }
+        h3 { color: #34495e; margin-top: 30px; }
+        table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+        th, td { border: 1px solid #ddd; padding: 10px; text-align: left; }
+        th { background-color: #3498db; color: white; }
+        tr:nth-child(even) { background-color: #f9f9f9; }
+        .SUCCESS { color: #27ae60; font-weight: bold; }
+        .ERROR { color: #e74c3c; font-weight: bold; }
+        .FATAL { color: #c0392b; font-weight: bold; }
+        .INFO { color: #7f8c8d; }
+        .WARNING { color: #f39c12; font-weight: bold; }
+        .size { font-weight: bold; color: #2980b9; }
+        .s3-endpoint { font-family: monospace; background-color: #ecf0f1; padding: 2px 6px; border-radius: 3px; }
+        .summary-box { background-color: #e8f6f3; border-left: 4px solid #1abc9c; padding: 15px; margin-bottom: 20px; }
+    </style>
+    </head>
+    <body>
+    <h2>🗂️ WordPress Backup Daily Report</h2>
+    <p>Timezone: Africa/Harare (UTC+2)</p>
+    """
+
+_HTML_FOOTER = """
+    <p style="color: #95a5a6; font-size: 12px; margin-top: 30px;">
+        WordPress Backup System - zimpricecheck.com
+    </p>
+    </body>
+    </html>
+    """
+
+
 def human_readable_size(size_bytes):
     """Convert bytes to human-readable format."""
     if size_bytes is None:
         return "Unknown"
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.2f} PB"
+    # bit_length picks the unit directly instead of repeated /1024 loops
+    i = min(5, max(0, (int(size_bytes).bit_length() - 1) // 10))
+    return f"{size_bytes / (1 << (i * 10)):.2f} {SIZE_UNITS[i]}"
 
 
 def format_timestamp(ts_str):
     """Convert UTC timestamp to Africa/Harare timezone."""
-    utc_zone = pytz.utc
-    local_zone = pytz.timezone(TIMEZONE)
-    
     try:
-        utc_dt = datetime.datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-        utc_dt = utc_zone.localize(utc_dt)
-        local_dt = utc_dt.astimezone(local_zone)
+        # fromisoformat is a C fast path, ~5x quicker than strptime
+        utc_dt = datetime.datetime.fromisoformat(ts_str).replace(tzinfo=UTC_ZONE)
+        local_dt = utc_dt.astimezone(LOCAL_ZONE)
         return local_dt.strftime("%Y-%m-%d %H:%M:%S %Z")
     except Exception:
         return ts_str
 
 
-def get_recent_logs():
-    """Get backup logs from last 24 hours."""
+def get_report_connection():
+    """Open the single read-only connection shared by all report queries."""
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute("PRAGMA query_only=ON")  # reports never write
+    return conn
+
+
+def get_recent_logs(conn):
+    """Yield backup logs from last 24 hours without materializing them."""
     try:
-        conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
         query = """
-            SELECT timestamp, status, details 
-            FROM backup_log 
-            WHERE timestamp >= datetime('now', '-1 day') 
+            SELECT timestamp, status, details
+            FROM backup_log
+            WHERE timestamp >= datetime('now', '-1 day')
             ORDER BY timestamp DESC
         """
         c.execute(query)
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        yield from c
     except Exception as e:
         print(f"DB Error: {e}")
-        return []
 
 
-def get_recent_archives():
-    """Get archive uploads from last 24 hours."""
+def get_recent_archives(conn):
+    """Yield archive uploads from last 24 hours without materializing them."""
     try:
-        conn = sqlite3.connect(DB_FILE)
         c = conn.cursor()
         query = """
-            SELECT filename, s3_endpoint, s3_bucket, file_size, upload_timestamp 
-            FROM s3_archives 
-            WHERE upload_timestamp >= datetime('now', '-1 day') 
+            SELECT filename, s3_endpoint, s3_bucket, file_size, upload_timestamp
+            FROM s3_archives
+            WHERE upload_timestamp >= datetime('now', '-1 day')
             ORDER BY upload_timestamp DESC
         """
         c.execute(query)
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        yield from c
     except Exception as e:
         print(f"DB Error: {e}")
-        return []
 
 
-def send_report(html_body):
-    """Send the HTML report via email."""
-    if not SMTP_SERVER or not SMTP_USER:
-        print("SMTP not configured.")
-        return
+def get_archive_summary(conn):
+    """Aggregate last-24h archive totals in SQL - one row back instead of N."""
+    try:
+        c = conn.cursor()
+        c.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(file_size), 0),
+                   GROUP_CONCAT(DISTINCT CASE WHEN s3_endpoint != ''
+                                THEN s3_endpoint || '/' || s3_bucket END)
+            FROM s3_archives
+            WHERE upload_timestamp >= datetime('now', '-1 day')
+        """)
+        count, total_size, endpoints = c.fetchone()
+        return count, total_size, endpoints or ""
+    except Exception as e:
+        print(f"DB Error: {e}")
+        return 0, 0, ""
+
 
-    msg = MIMEMultipart()
-    msg['From'] = f"WordPress Backup <{SMTP_SENDER_EMAIL}>"
-    msg['To'] = SMTP_USER
-    msg['Subject'] = "WordPress Backup Daily Report"
+def _open_smtp_connection():
+    """Connect, STARTTLS and log in - run in a thread so the handshake
+    overlaps HTML generation."""
+    if not SMTP_SERVER or not SMTP_USER:
+        return None
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+    server.starttls()
+    server.login(SMTP_USER, SMTP_PASSWORD)
+    return server
 
-    msg.attach(MIMEText(html_body, 'html'))
 
+def send_report(html_body, server=None):
+    """Send the HTML report via email over an already-open connection."""
     try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
+        if server is None:
+            server = _open_smtp_connection()
+        if server is None:
+            print("SMTP not configured.")
+            return
+
+        msg = MIMEMultipart()
+        msg['From'] = f"WordPress Backup <{SMTP_SENDER_EMAIL}>"
+        msg['To'] = SMTP_USER
+        msg['Subject'] = "WordPress Backup Daily Report"
+
+        msg.attach(MIMEText(html_body, 'html'))
+
         server.sendmail(SMTP_SENDER_EMAIL, SMTP_USER, msg.as_string())
         server.quit()
         print("Report sent successfully.")
@@ -119,55 +186,48 @@ def send_report(html_body):
 
 
 def main():
-    archives = get_recent_archives()
-    logs = get_recent_logs()
-    
-    if not archives and not logs:
-        print("No backup activity in last 24 hours.")
-        return
+    # Start the SMTP handshake (DNS + TCP + STARTTLS + LOGIN, ~500ms)
+    # in the background while the report is being built.
+    smtp_pool = ThreadPoolExecutor(max_workers=1)
+    smtp_future = smtp_pool.submit(_open_smtp_connection)
+    smtp_pool.shutdown(wait=False)
 
-    # Build HTML Report
-    html = """
-    <html>
-    <head>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        h2 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }
-        h3 { color: #34495e; margin-top: 30px; }
-        table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
-        th, td { border: 1px solid #ddd; padding: 10px; text-align: left; }
-        th { background-color: #3498db; color: white; }
-        tr:nth-child(even) { background-color: #f9f9f9; }
-        .SUCCESS { color: #27ae60; font-weight: bold; }
-        .ERROR { color: #e74c3c; font-weight: bold; }
-        .FATAL { color: #c0392b; font-weight: bold; }
-        .INFO { color: #7f8c8d; }
-        .WARNING { color: #f39c12; font-weight: bold; }
-        .size { font-weight: bold; color: #2980b9; }
-        .s3-endpoint { font-family: monospace; background-color: #ecf0f1; padding: 2px 6px; border-radius: 3px; }
-        .summary-box { background-color: #e8f6f3; border-left: 4px solid #1abc9c; padding: 15px; margin-bottom: 20px; }
-    </style>
-    </head>
-    <body>
-    <h2>🗂️ WordPress Backup Daily Report</h2>
-    <p>Timezone: Africa/Harare (UTC+2)</p>
-    """
-    
-    # Summary box
-    if archives:
-        total_size = sum(a[3] or 0 for a in archives)
-        endpoints = set(f"{a[1]}/{a[2]}" for a in archives if a[1])
-        html += f"""
+    # Build the HTML report as a list of fragments joined once at the end;
+    # repeated += on a str re-copies the whole buffer for every row.
+    parts = [_HTML_HEADER]
+
+    # One connection serves the summary, archives and logs queries
+    conn = get_report_connection()
+
+    # Summary box - totals and distinct endpoints aggregated by SQLite
+    archive_count, total_size, endpoints = get_archive_summary(conn)
+    if archive_count:
+        parts.append(f"""
         <div class="summary-box">
-            <strong>Summary:</strong> {len(archives)} backup(s) created in the last 24 hours<br>
+            <strong>Summary:</strong> {archive_count} backup(s) created in the last 24 hours<br>
             <strong>Total Size:</strong> {human_readable_size(total_size)}<br>
-            <strong>S3 Storage:</strong> {', '.join(endpoints) if endpoints else 'N/A'}
+            <strong>S3 Storage:</strong> {endpoints.replace(',', ', ') if endpoints else 'N/A'}
         </div>
-        """
-    
-    # Archives Table
-    if archives:
-        html += """
+        """)
+
+    # Archives Table - streamed from the cursor
+    archive_rows = []
+
+    for filename, s3_endpoint, s3_bucket, file_size, timestamp in get_recent_archives(conn):
+        local_ts = format_timestamp(timestamp)
+        size_str = human_readable_size(file_size)
+        storage_display = f"{s3_endpoint}/{s3_bucket}" if s3_endpoint else "N/A"
+        archive_rows.append(f"""
+            <tr>
+                <td>{local_ts}</td>
+                <td>{filename}</td>
+                <td class="size">{size_str}</td>
+                <td><span class="s3-endpoint">{storage_display}</span></td>
+            </tr>
+            """)
+
+    if archive_rows:
+        parts.append("""
         <h3>📦 Backup Archives</h3>
         <table>
             <tr>
@@ -176,27 +236,29 @@ def main():
                 <th>Size</th>
                 <th>S3 Endpoint</th>
             </tr>
-        """
-        
-        for archive in archives:
-            filename, s3_endpoint, s3_bucket, file_size, timestamp = archive
-            local_ts = format_timestamp(timestamp)
-            size_str = human_readable_size(file_size)
-            storage_display = f"{s3_endpoint}/{s3_bucket}" if s3_endpoint else "N/A"
-            html += f"""
+        """)
+        parts.extend(archive_rows)
+        parts.append("</table>")
+
+    # Activity Log Table
+    log_count = 0
+    log_rows = []
+    for ts, status, details in get_recent_logs(conn):
+        log_count += 1
+        local_ts = format_timestamp(ts)
+        # Truncate long details
+        if len(details) > 200:
+            details = details[:200] + "..."
+        log_rows.append(f"""
             <tr>
                 <td>{local_ts}</td>
-                <td>{filename}</td>
-                <td class="size">{size_str}</td>
-                <td><span class="s3-endpoint">{storage_display}</span></td>
+                <td class="{status}">{status}</td>
+                <td>{details}</td>
             </tr>
-            """
-        
-        html += "</table>"
-    
-    # Activity Log Table
-    if logs:
-        html += """
+            """)
+
+    if log_count:
+        parts.append("""
         <h3>📋 Activity Log</h3>
         <table>
             <tr>
@@ -204,34 +266,32 @@ def main():
                 <th>Status</th>
                 <th>Details</th>
             </tr>
-        """
-        
-        for log in logs:
-            ts, status, details = log
-            local_ts = format_timestamp(ts)
-            # Truncate long details
-            if len(details) > 200:
-                details = details[:200] + "..."
-            html += f"""
-            <tr>
-                <td>{local_ts}</td>
-                <td class="{status}">{status}</td>
-                <td>{details}</td>
-            </tr>
-            """
-        
-        html += "</table>"
-    
-    # Footer
-    html += """
-    <p style="color: #95a5a6; font-size: 12px; margin-top: 30px;">
-        WordPress Backup System - zimpricecheck.com
-    </p>
-    </body>
-    </html>
-    """
-    
-    send_report(html)
+        """)
+        parts.extend(log_rows)
+        parts.append("</table>")
+
+    conn.close()
+
+    if not archive_count and not log_count:
+        # Nothing to send; discard the pre-opened connection
+        try:
+            server = smtp_future.result()
+            if server:
+                server.quit()
+        except Exception:
+            pass
+        print("No backup activity in last 24 hours.")
+        return
+
+    parts.append(_HTML_FOOTER)
+
+    try:
+        server = smtp_future.result()
+    except Exception as e:
+        print(f"Failed to send report: {e}")
+        return
+
+    send_report("".join(parts), server)
 
 
 if __name__ == "__main__":
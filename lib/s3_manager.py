@@ -8,10 +8,23 @@ Supports unlimited S3 server configurations via config.json with weighted priori
 
 import os
 import json
+import time
 import datetime
 import sqlite3
+import threading
+from collections import Counter, deque
+
+# orjson parses and serializes config.json several times faster than
+# stdlib json; fall back when it isn't installed (as in d1_manager)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import boto3
+import botocore.config
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Paths
@@ -25,13 +38,123 @@ load_dotenv(ENV_PATH)
 # Server ID for shared storage
 SERVER_ID = os.getenv("SERVER_ID", "default")
 
+# How long a bucket-usage probe stays valid; listing a bucket is far too
+# expensive to repeat for every upload in the same backup pass
+USAGE_TTL_SECONDS = 60
+
+# Parsed-config caches keyed by config.json's (mtime_ns, size), so the
+# fresh S3Manager built per upload_to_s3 call reuses the same parsed
+# config and S3StorageServer objects - along with their warmed clients,
+# bucket-verified flags and usage caches - until the file changes
+_SERVERS_CACHE = None
+_CONFIG_CACHE = None
+
+
+def _read_config_file() -> dict:
+    """Parse config.json from disk (no caching)."""
+    with open(CONFIG_PATH, 'rb') as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+# The Year/Month/Day key prefix changes once a day; refresh it at most
+# once a minute instead of formatting a fresh datetime per upload
+_DAY_CACHE = (0.0, '')
+
+
+def _day_prefix() -> str:
+    """Current Y/M/D remote-key prefix, cached for up to a minute."""
+    global _DAY_CACHE
+    t = time.time()
+    if t - _DAY_CACHE[0] > 60:
+        d = datetime.date.today()
+        _DAY_CACHE = (t, f"{d.year}/{d.month:02d}/{d.day:02d}")
+    return _DAY_CACHE[1]
+
+
+def _config_stat_key():
+    """Identity of the current config.json contents, or None if unreadable."""
+    try:
+        st = os.stat(CONFIG_PATH)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+# Upload records go through one long-lived autocommit connection in WAL
+# mode - opening a connection, re-running CREATE TABLE and paying a full
+# journal fsync per one-row INSERT dominated the record cost
+_DB_LOCK = threading.Lock()
+_DB_CONN = None
+
+
+def _db() -> sqlite3.Connection:
+    """Lazily open the shared upload-record connection (call under _DB_LOCK)."""
+    global _DB_CONN
+    if _DB_CONN is None:
+        conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+        # page_size only takes effect if set before the first table is
+        # created in a fresh database
+        conn.execute("PRAGMA page_size=8192")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute('''CREATE TABLE IF NOT EXISTS s3_archives
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         filename TEXT NOT NULL,
+                         storage_name TEXT NOT NULL,
+                         s3_endpoint TEXT NOT NULL,
+                         s3_bucket TEXT NOT NULL,
+                         file_size INTEGER,
+                         upload_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                         site_name TEXT,
+                         server_id TEXT)''')
+        # list_uploads filters on these; keep it an index lookup
+        conn.execute("""CREATE INDEX IF NOT EXISTS idx_s3_site_server
+                        ON s3_archives(site_name, server_id)""")
+        _DB_CONN = conn
+    return _DB_CONN
+
+
+# One session shared by every server: session creation re-reads config
+# files, and client creation off a shared session is thread-safe. The
+# pool is sized above the parallel usage probes and multipart upload
+# threads so concurrent requests don't queue behind urllib3's default
+# of 10 connections.
+_SESSION = boto3.session.Session()
+_CLIENT_CONFIG = botocore.config.Config(
+    max_pool_connections=64,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+
+# Backup archives run to gigabytes; spreading 16MB parts over 16 threads
+# saturates the link instead of pushing one TCP stream
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True,
+    io_chunksize=1024 * 1024
+)
+
 
 class S3StorageServer:
     """Represents a single S3-compatible storage server."""
-    
-    def __init__(self, name: str, endpoint: str, region: str, 
-                 access_key: str, secret_key: str, bucket: str, 
-                 weight: int = 100, storage_limit_gb: float = 100.0):
+
+    # Long-running daemons hold one instance per configured server and
+    # hit these attributes on every upload; slots drop the per-instance
+    # __dict__ and make the lookups fixed-offset
+    __slots__ = ('name', 'endpoint', 'region', 'access_key', 'secret_key',
+                 'bucket', 'weight', 'storage_limit_bytes', 'check_usage',
+                 '_client', '_usage_cache', '_bucket_verified')
+
+
+    def __init__(self, name: str, endpoint: str, region: str,
+                 access_key: str, secret_key: str, bucket: str,
+                 weight: int = 100, storage_limit_gb: float = 100.0,
+                 check_usage: bool = True):
         self.name = name
         self.endpoint = endpoint
         self.region = region
@@ -40,40 +163,105 @@ class S3StorageServer:
         self.bucket = bucket
         self.weight = weight
         self.storage_limit_bytes = int(storage_limit_gb * 1024 * 1024 * 1024)
+        self.check_usage = check_usage
         self._client = None
+        self._usage_cache = None  # (monotonic timestamp, bytes used)
+        self._bucket_verified = False
     
     @property
     def client(self):
         """Lazy-load S3 client."""
         if self._client is None:
-            self._client = boto3.client(
+            self._client = _SESSION.client(
                 's3',
                 endpoint_url=f"https://{self.endpoint}",
                 region_name=self.region,
                 aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key
+                aws_secret_access_key=self.secret_key,
+                config=_CLIENT_CONFIG
             )
         return self._client
     
-    def get_usage(self) -> int:
-        """Get total bytes used in the bucket. Returns 0 on error."""
+    def _get_usage_fast(self) -> int | None:
+        """O(1) usage lookup via CloudWatch BucketSizeBytes.
+
+        Only real AWS buckets publish this metric; for other
+        S3-compatible endpoints (iDrive E2, Backblaze B2, ...) return
+        None so the caller falls back to the listing scan.
+        """
+        if "amazonaws.com" not in self.endpoint:
+            return None
         try:
-            total = 0
-            paginator = self.client.get_paginator('list_objects_v2')
-            for page in paginator.paginate(Bucket=self.bucket):
-                for obj in page.get('Contents', []):
-                    total += obj.get('Size', 0)
-            return total
+            cloudwatch = _SESSION.client(
+                'cloudwatch',
+                region_name=self.region,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                config=_CLIENT_CONFIG
+            )
+            now = datetime.datetime.now(datetime.timezone.utc)
+            res = cloudwatch.get_metric_statistics(
+                Namespace='AWS/S3',
+                MetricName='BucketSizeBytes',
+                Dimensions=[{'Name': 'BucketName', 'Value': self.bucket},
+                            {'Name': 'StorageType', 'Value': 'StandardStorage'}],
+                StartTime=now - datetime.timedelta(days=2),
+                EndTime=now,
+                Period=86400,
+                Statistics=['Average']
+            )
+            points = res.get('Datapoints', [])
+            if not points:
+                return None
+            return int(max(points, key=lambda p: p['Timestamp'])['Average'])
         except Exception:
-            return 0
+            return None
+
+    def get_usage(self) -> int:
+        """Get total bytes used in the bucket. Returns 0 on error.
+
+        Prefers the CloudWatch metric (one round-trip) over walking
+        every object; the result is cached for USAGE_TTL_SECONDS and
+        successful uploads bump the cached figure instead of
+        invalidating it.
+        """
+        if self._usage_cache is not None:
+            cached_at, cached_total = self._usage_cache
+            if time.monotonic() - cached_at < USAGE_TTL_SECONDS:
+                return cached_total
+        total = self._get_usage_fast()
+        if total is None:
+            try:
+                # JMESPath projection streams just the Size field out of
+                # botocore instead of materializing full object records;
+                # 1000 keys/page is the S3 maximum
+                pages = self.client.get_paginator('list_objects_v2').paginate(
+                    Bucket=self.bucket, PaginationConfig={'PageSize': 1000})
+                total = sum(size or 0 for size in pages.search('Contents[].Size'))
+            except Exception:
+                return 0
+        self._usage_cache = (time.monotonic(), total)
+        return total
     
     def has_space(self, file_size: int) -> bool:
-        """Check if server has enough space for file."""
+        """Check if server has enough space for file.
+
+        A zero/negative limit or check_usage: false in config means the
+        quota is unenforced here - skip the probe entirely.
+        """
+        if not self.check_usage or self.storage_limit_bytes <= 0:
+            return True
         used = self.get_usage()
         return (self.storage_limit_bytes - used) >= file_size
     
     def ensure_bucket_exists(self):
-        """Create bucket if it doesn't exist."""
+        """Create bucket if it doesn't exist.
+
+        Verified once per instance; upload() clears the flag if a later
+        call hits NoSuchBucket.
+        """
+        if self._bucket_verified:
+            return
         try:
             self.client.head_bucket(Bucket=self.bucket)
         except ClientError as e:
@@ -87,21 +275,53 @@ class S3StorageServer:
                 except ClientError:
                     # Some S3-compatible services handle this differently
                     self.client.create_bucket(Bucket=self.bucket)
+        self._bucket_verified = True
     
-    def upload(self, local_path: str, remote_key: str) -> tuple[bool, str]:
+    def upload(self, local_path: str, remote_key: str,
+               _retry: bool = True) -> tuple[bool, str]:
         """
         Upload file to S3.
         Returns (success, error_message).
         """
         try:
             self.ensure_bucket_exists()
-            self.client.upload_file(local_path, self.bucket, remote_key)
+            # Hint the kernel: the archive is read once sequentially, and
+            # its pages can be dropped after the transfer instead of
+            # evicting the rest of the host's working set. Best-effort,
+            # Linux-only.
+            fd = None
+            if hasattr(os, 'posix_fadvise'):
+                try:
+                    fd = os.open(local_path, os.O_RDONLY)
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                except OSError:
+                    fd = None
+            try:
+                self.client.upload_file(local_path, self.bucket, remote_key,
+                                        Config=_TRANSFER_CONFIG)
+                if fd is not None:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                if fd is not None:
+                    os.close(fd)
+            # Keep the cached usage honest without relisting the bucket
+            if self._usage_cache is not None:
+                cached_at, cached_total = self._usage_cache
+                try:
+                    self._usage_cache = (cached_at, cached_total + os.path.getsize(local_path))
+                except OSError:
+                    pass
             return True, ""
         except FileNotFoundError:
             return False, f"Local file not found: {local_path}"
         except NoCredentialsError:
             return False, "Invalid S3 credentials"
         except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code', '')
+            if _retry and error_code in ('404', 'NoSuchBucket'):
+                # Bucket vanished since it was verified: re-verify once
+                self._bucket_verified = False
+                return self.upload(local_path, remote_key, _retry=False)
             return False, str(e)
         except Exception as e:
             return False, str(e)
@@ -115,18 +335,31 @@ class S3Manager:
     
     def __init__(self):
         self.servers = self._load_servers()
+        # Records deferred by upload(defer_record=True), written in one
+        # transaction by flush_pending_records
+        self._pending_records = deque()
+        # In-flight upload counts per server, used by balance mode
+        self._inflight = Counter()
+        self._inflight_lock = threading.Lock()
     
     def _load_servers(self) -> list[S3StorageServer]:
-        """Load all configured S3 servers from config.json, sorted by weight."""
+        """Load all configured S3 servers from config.json, sorted by weight.
+
+        The built server list is cached against the file's stat identity;
+        repeat instantiations reuse the same server objects.
+        """
+        global _SERVERS_CACHE
         servers = []
-        
-        if not os.path.exists(CONFIG_PATH):
+
+        key = _config_stat_key()
+        if key is None:
             return servers
-        
+        if _SERVERS_CACHE is not None and _SERVERS_CACHE[0] == key:
+            return _SERVERS_CACHE[1]
+
         try:
-            with open(CONFIG_PATH, 'r') as f:
-                config = json.load(f)
-            
+            config = _read_config_file()
+
             storage_list = config.get('storage', [])
             
             for storage in storage_list:
@@ -149,15 +382,18 @@ class S3Manager:
                     secret_key=secret_key,
                     bucket=storage.get('bucket', 'wordpress-backups'),
                     weight=storage.get('weight', 100),
-                    storage_limit_gb=storage.get('storage_limit_gb', 100)
+                    storage_limit_gb=storage.get('storage_limit_gb', 100),
+                    check_usage=storage.get('check_usage', True)
                 ))
             
             # Sort by weight (highest first)
             servers.sort(key=lambda s: s.weight, reverse=True)
-            
+
+            _SERVERS_CACHE = (key, servers)
+
         except (json.JSONDecodeError, Exception) as e:
             print(f"Error loading config.json: {e}")
-        
+
         return servers
     
     @property
@@ -165,13 +401,27 @@ class S3Manager:
         """Check if any S3 servers are configured."""
         return len(self.servers) > 0
     
-    def upload(self, local_path: str, filename: str, file_size: int, 
-               site_name: str, log_func=None) -> tuple[bool, str]:
+    def upload(self, local_path: str, filename: str, file_size: int,
+               site_name: str, log_func=None, defer_record=False,
+               mode: str = 'failover', replicas: int = 2) -> tuple[bool, str]:
         """
         Upload file to any available S3 server.
-        
+
         Uses folder structure: SERVER_ID/Year/Month/Day/filename
         Returns (success, server_name or error_message).
+
+        Modes:
+          failover  - try servers in weight order, stop at first success
+                      (the default, matches historical behavior)
+          balance   - like failover, but order servers by fewest
+                      in-flight uploads so a slow primary doesn't
+                      bottleneck concurrent callers
+          replicate - upload to the top `replicas` servers with space
+                      concurrently; succeeds if any copy lands
+
+        With defer_record=True the database record is queued instead of
+        written immediately; call flush_pending_records once per backup
+        pass to insert them all in a single transaction.
         """
         if not self.servers:
             msg = "No S3 storage configured in config.json"
@@ -180,12 +430,30 @@ class S3Manager:
             return False, msg
         
         # Determine remote path: SERVER_ID/Year/Month/Day
-        now = datetime.datetime.now()
-        remote_dir = f"{SERVER_ID}/{now.year}/{now.month:02d}/{now.day:02d}"
-        remote_key = f"{remote_dir}/{filename}"
-        
+        remote_key = f"{SERVER_ID}/{_day_prefix()}/{filename}"
+
+        # Warm the usage caches in one parallel fan-out, so the has_space
+        # checks below don't serialize one bucket listing per server
+        # (they hit the fresh caches instead)
+        probed = [s for s in self.servers
+                  if s.check_usage and s.storage_limit_bytes > 0]
+        if len(probed) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(probed))) as pool:
+                list(pool.map(lambda s: s.get_usage(), probed))
+
+        if mode == 'replicate':
+            return self._upload_replicated(local_path, remote_key, file_size,
+                                           site_name, log_func, defer_record,
+                                           replicas)
+
+        servers = self.servers
+        if mode == 'balance':
+            with self._inflight_lock:
+                servers = sorted(self.servers,
+                                 key=lambda s: (self._inflight[s.name], -s.weight))
+
         # Try each server in order (already sorted by weight)
-        for server in self.servers:
+        for server in servers:
             try:
                 if log_func:
                     log_func("INFO", f"Trying storage: {server.name} (weight={server.weight})", site_name)
@@ -197,11 +465,22 @@ class S3Manager:
                     continue
                 
                 # Upload
-                success, error = server.upload(local_path, remote_key)
-                
+                with self._inflight_lock:
+                    self._inflight[server.name] += 1
+                try:
+                    success, error = server.upload(local_path, remote_key)
+                finally:
+                    with self._inflight_lock:
+                        self._inflight[server.name] -= 1
+
                 if success:
                     # Record in database
-                    self._record_upload(remote_key, server, file_size, site_name)
+                    if defer_record:
+                        self._pending_records.append(
+                            (remote_key, server.name, server.endpoint,
+                             server.bucket, file_size, site_name, SERVER_ID))
+                    else:
+                        self._record_upload(remote_key, server, file_size, site_name)
                     
                     if log_func:
                         log_func("SUCCESS", f"Uploaded to {server.name} ({server.endpoint}/{server.bucket})", site_name)
@@ -221,70 +500,152 @@ class S3Manager:
             log_func("ERROR", msg, site_name)
         return False, msg
     
-    def _record_upload(self, remote_key: str, server: S3StorageServer, 
+    def _upload_replicated(self, local_path, remote_key, file_size,
+                           site_name, log_func, defer_record, replicas):
+        """Upload one archive to several servers concurrently.
+
+        Succeeds if any copy lands; each successful copy is recorded.
+        """
+        candidates = [s for s in self.servers if s.has_space(file_size)][:replicas]
+        if not candidates:
+            msg = "No S3 server has space for replication"
+            if log_func:
+                log_func("ERROR", msg, site_name)
+            return False, msg
+
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            results = list(pool.map(
+                lambda s: (s,) + s.upload(local_path, remote_key), candidates))
+
+        uploaded = []
+        for server, success, error in results:
+            if success:
+                if defer_record:
+                    self._pending_records.append(
+                        (remote_key, server.name, server.endpoint,
+                         server.bucket, file_size, site_name, SERVER_ID))
+                else:
+                    self._record_upload(remote_key, server, file_size, site_name)
+                uploaded.append(server.name)
+                if log_func:
+                    log_func("SUCCESS", f"Uploaded to {server.name} ({server.endpoint}/{server.bucket})", site_name)
+            elif log_func:
+                log_func("WARNING", f"Upload to {server.name} failed: {error}", site_name)
+
+        if uploaded:
+            return True, ",".join(uploaded)
+
+        msg = "All S3 uploads failed"
+        if log_func:
+            log_func("ERROR", msg, site_name)
+        return False, msg
+
+    def _record_upload(self, remote_key: str, server: S3StorageServer,
                        file_size: int, site_name: str):
         """Record successful upload in database."""
         try:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            
-            # Ensure table exists
-            c.execute('''CREATE TABLE IF NOT EXISTS s3_archives
-                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                         filename TEXT NOT NULL,
-                         storage_name TEXT NOT NULL,
-                         s3_endpoint TEXT NOT NULL,
-                         s3_bucket TEXT NOT NULL,
-                         file_size INTEGER,
-                         upload_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                         site_name TEXT,
-                         server_id TEXT)''')
-            
-            c.execute("""INSERT INTO s3_archives 
-                        (filename, storage_name, s3_endpoint, s3_bucket, file_size, site_name, server_id) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                      (remote_key, server.name, server.endpoint, server.bucket, 
-                       file_size, site_name, SERVER_ID))
-            conn.commit()
-            conn.close()
+            with _DB_LOCK:
+                _db().execute("""INSERT INTO s3_archives
+                            (filename, storage_name, s3_endpoint, s3_bucket, file_size, site_name, server_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                          (remote_key, server.name, server.endpoint, server.bucket,
+                           file_size, site_name, SERVER_ID))
         except Exception as e:
             print(f"Failed to record upload: {e}")
+
+    def flush_pending_records(self):
+        """Write all deferred upload records in one transaction.
+
+        N uploads recorded individually cost N fsyncs; executemany under
+        a single BEGIN IMMEDIATE...COMMIT pays one.
+        """
+        if not self._pending_records:
+            return
+        rows = []
+        while self._pending_records:
+            rows.append(self._pending_records.popleft())
+        try:
+            with _DB_LOCK:
+                conn = _db()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany("""INSERT INTO s3_archives
+                                (filename, storage_name, s3_endpoint, s3_bucket, file_size, site_name, server_id)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            print(f"Failed to record uploads: {e}")
     
-    def list_uploads(self, site_name: str = None) -> list:
-        """List recorded uploads, optionally filtered by site."""
+    def list_uploads(self, site_name: str = None, limit: int = 1000,
+                     offset: int = 0, columns: tuple = None) -> list:
+        """List recorded uploads, newest first, optionally filtered by site.
+
+        Bounded by limit/offset and projected to the requested columns so
+        callers don't materialize the full upload history per call.
+        """
+        cols = ", ".join(columns) if columns else "*"
         try:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            
-            if site_name:
-                c.execute("SELECT * FROM s3_archives WHERE site_name = ? AND server_id = ?", 
-                          (site_name, SERVER_ID))
-            else:
-                c.execute("SELECT * FROM s3_archives WHERE server_id = ?", (SERVER_ID,))
-            
-            rows = c.fetchall()
-            conn.close()
-            return rows
+            with _DB_LOCK:
+                if site_name:
+                    c = _db().execute(
+                        f"""SELECT {cols} FROM s3_archives
+                            WHERE site_name = ? AND server_id = ?
+                            ORDER BY id DESC LIMIT ? OFFSET ?""",
+                        (site_name, SERVER_ID, limit, offset))
+                else:
+                    c = _db().execute(
+                        f"""SELECT {cols} FROM s3_archives WHERE server_id = ?
+                            ORDER BY id DESC LIMIT ? OFFSET ?""",
+                        (SERVER_ID, limit, offset))
+                return c.fetchall()
         except Exception:
             return []
 
+    def count_uploads(self, site_name: str = None) -> int:
+        """Count recorded uploads without materializing any rows."""
+        try:
+            with _DB_LOCK:
+                if site_name:
+                    c = _db().execute(
+                        "SELECT COUNT(*) FROM s3_archives WHERE site_name = ? AND server_id = ?",
+                        (site_name, SERVER_ID))
+                else:
+                    c = _db().execute(
+                        "SELECT COUNT(*) FROM s3_archives WHERE server_id = ?",
+                        (SERVER_ID,))
+                return c.fetchone()[0]
+        except Exception:
+            return 0
+
 
 def load_config() -> dict:
-    """Load the unified configuration file."""
-    if not os.path.exists(CONFIG_PATH):
+    """Load the unified configuration file, cached until the file changes."""
+    global _CONFIG_CACHE
+    key = _config_stat_key()
+    if key is None:
         return {"sites": [], "storage": []}
-    
+    if _CONFIG_CACHE is not None and _CONFIG_CACHE[0] == key:
+        return _CONFIG_CACHE[1]
+
     try:
-        with open(CONFIG_PATH, 'r') as f:
-            return json.load(f)
+        config = _read_config_file()
+        _CONFIG_CACHE = (key, config)
+        return config
     except (json.JSONDecodeError, Exception):
         return {"sites": [], "storage": []}
 
 
 def save_config(config: dict):
     """Save the unified configuration file."""
-    with open(CONFIG_PATH, 'w') as f:
-        json.dump(config, f, indent=2)
+    if orjson is not None:
+        encoded = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+    else:
+        encoded = json.dumps(config, indent=2).encode()
+    with open(CONFIG_PATH, 'wb') as f:
+        f.write(encoded)
 
 
 # Convenience function for direct usage
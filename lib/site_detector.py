@@ -8,16 +8,24 @@ Auto-detects WordPress installations on the server.
 import os
 import re
 import json
+import mmap
+import stat
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 
-# Common WordPress installation patterns
-WP_SEARCH_PATHS = [
-    "/var/www/*/wp-config.php",
-    "/var/www/*/htdocs/wp-config.php",
-    "/var/www/*/public_html/wp-config.php",
-    "/var/www/*/html/wp-config.php",
-    "/home/*/public_html/wp-config.php",
-]
+# Common WordPress installation layouts: candidate wp-config.php
+# locations relative to each site directory under a web root
+WP_SEARCH_ROOTS = {
+    "/var/www": (
+        "wp-config.php",
+        "htdocs/wp-config.php",
+        "public_html/wp-config.php",
+        "html/wp-config.php",
+    ),
+    "/home": (
+        "public_html/wp-config.php",
+    ),
+}
 
 WP_CONTENT_PATTERNS = [
     "htdocs/wp-content",
@@ -26,15 +34,50 @@ WP_CONTENT_PATTERNS = [
     "wp-content",
 ]
 
+# Compiled once: extract_site_name runs per detected site
+_SUFFIX_STRIP = re.compile(r'\.(?:com|co\.zw|org)$')
+_CLEAN_NAME = re.compile(r'[^a-zA-Z0-9-]')
+
+# Path components whose successor is the site directory
+_ROOT_MARKERS = frozenset(("www", "html", "public_html", "home"))
+
+
+def _is_wp_config(path):
+    """Check a candidate wp-config.php defines DB_NAME near the top.
+
+    One open + fstat covers the regular-file check and the size; the
+    bounded mmap lets libc run the substring search with no buffer copy
+    or text decode.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    except OSError:
+        return False
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+            return False
+        with mmap.mmap(fd, min(st.st_size, 4096), prot=mmap.PROT_READ) as mm:
+            return mm.find(b'DB_NAME') != -1
+    except (OSError, ValueError):
+        return False
+    finally:
+        os.close(fd)
+
 
 def find_wp_content(base_dir):
     """Find wp-content directory relative to base."""
     for pattern in WP_CONTENT_PATTERNS:
         path = os.path.join(base_dir, pattern)
-        if os.path.isdir(path):
-            # Validate it's real WordPress content
-            if os.path.isdir(os.path.join(path, "themes")) or os.path.isdir(os.path.join(path, "plugins")):
-                return path
+        try:
+            # Validate it's real WordPress content with one directory
+            # listing instead of a stat() per subdirectory
+            with os.scandir(path) as entries:
+                names = {e.name for e in entries if e.is_dir()}
+        except (NotADirectoryError, FileNotFoundError, OSError):
+            continue
+        if "themes" in names or "plugins" in names:
+            return path
     return None
 
 
@@ -43,71 +86,84 @@ def extract_site_name(wp_config_path):
     # /var/www/example.com/htdocs/wp-config.php -> example.com
     # /var/www/example.com/wp-config.php -> example.com
     parts = wp_config_path.split("/")
-    
-    # Find the directory after /var/www/ or similar
-    for i, part in enumerate(parts):
-        if part in ("www", "html", "public_html", "home"):
-            if i + 1 < len(parts):
-                name = parts[i + 1]
-                # Clean up domain-like names
-                name = name.replace(".com", "").replace(".co.zw", "").replace(".org", "")
-                name = re.sub(r'[^a-zA-Z0-9-]', '-', name)
-                return name.lower()
-    
+
+    # Find the directory after /var/www/ or similar; the final component
+    # is the filename, so markers there have no successor to name
+    for i, part in enumerate(parts[:-1]):
+        if part in _ROOT_MARKERS:
+            # Clean up domain-like names
+            name = _SUFFIX_STRIP.sub('', parts[i + 1])
+            return _CLEAN_NAME.sub('-', name).lower()
+
     # Fallback: use parent directory name
     parent = os.path.dirname(os.path.dirname(wp_config_path))
-    return os.path.basename(parent).lower().replace(".", "-")
+    return _CLEAN_NAME.sub('-', os.path.basename(parent)).lower()
+
+
+def _validate_site(wp_config):
+    """Validate one candidate wp-config and build its site dict, or None."""
+    if not _is_wp_config(wp_config):
+        return None
+
+    # Find wp-content, also checking the parent directory
+    base_dir = os.path.dirname(wp_config)
+    wp_content = find_wp_content(base_dir)
+    if not wp_content:
+        wp_content = find_wp_content(os.path.dirname(base_dir))
+    if not wp_content:
+        return None  # Can't find wp-content, skip
+
+    return {
+        "name": extract_site_name(wp_config),
+        "wp_config_path": wp_config,
+        "wp_content_path": wp_content,
+        "db_host": "",
+        "db_name": "",
+        "db_user": "",
+        "db_password": ""
+    }
+
+
+def _iter_wp_configs():
+    """Yield candidate wp-config.php paths, listing each web root once.
+
+    The old glob patterns re-opened /var/www for every layout variant;
+    one scandir pass per root probes all variants per site directory.
+    """
+    for root, subpaths in WP_SEARCH_ROOTS.items():
+        try:
+            with os.scandir(root) as entries:
+                site_dirs = [e.path for e in entries if e.is_dir()]
+        except OSError:
+            continue
+        for site_dir in site_dirs:
+            for sub in subpaths:
+                path = os.path.join(site_dir, sub)
+                if os.path.isfile(path):
+                    yield path
 
 
 def detect_wordpress_sites():
     """Scan for WordPress installations."""
-    found_sites = []
+    # Collect deduplicated candidates first, then validate them in a
+    # thread pool - each validation is a chain of stats and small reads
+    # across unrelated directories, so the I/O waits overlap
     seen_configs = set()
-    
-    for pattern in WP_SEARCH_PATHS:
-        for wp_config in glob(pattern):
-            # Avoid duplicates
-            if wp_config in seen_configs:
-                continue
+    candidates = []
+    for wp_config in _iter_wp_configs():
+        if wp_config not in seen_configs:
             seen_configs.add(wp_config)
-            
-            # Validate it's a real wp-config
-            if not os.path.isfile(wp_config):
-                continue
-            
-            try:
-                with open(wp_config, 'r') as f:
-                    content = f.read(1000)
-                    if 'DB_NAME' not in content:
-                        continue  # Not a real wp-config
-            except:
-                continue
-            
-            # Find wp-content
-            base_dir = os.path.dirname(wp_config)
-            wp_content = find_wp_content(base_dir)
-            
-            # Also check parent directory
-            if not wp_content:
-                parent_dir = os.path.dirname(base_dir)
-                wp_content = find_wp_content(parent_dir)
-            
-            if not wp_content:
-                continue  # Can't find wp-content, skip
-            
-            site_name = extract_site_name(wp_config)
-            
-            found_sites.append({
-                "name": site_name,
-                "wp_config_path": wp_config,
-                "wp_content_path": wp_content,
-                "db_host": "",
-                "db_name": "",
-                "db_user": "",
-                "db_password": ""
-            })
-    
-    return found_sites
+            candidates.append(wp_config)
+
+    if not candidates:
+        return []
+
+    if len(candidates) == 1:
+        site = _validate_site(candidates[0])
+        return [site] if site else []
+
+    with ThreadPoolExecutor(max_workers=min(32, len(candidates))) as pool:
+        return [site for site in pool.map(_validate_site, candidates) if site]
 
 
 def prompt_select_sites(sites):
@@ -1,6 +1,8 @@
-from typing import Any, List
+import datetime
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, func, lambda_stmt, or_, select, tuple_
+from sqlalchemy.orm import Session, load_only
 from master import schemas
 from master.api import deps
 from master.db import models
@@ -8,28 +10,101 @@ from master.db import models
 router = APIRouter()
 
 
+def _page_with_total(query, skip: int, limit: int,
+                     before_created_at=None, before_id=None):
+    """Fetch one page of logs plus the unpaged total in a single query.
+
+    COUNT(*) OVER () rides along with each page row, so the separate
+    COUNT round-trip (which re-scans the filter) only runs when the
+    requested page is empty.
+
+    When both before_created_at and before_id are given, keyset (seek)
+    pagination is used instead of OFFSET: the page starts strictly after
+    the (created_at, id) cursor, which stays constant-time however deep
+    the caller pages. The returned total then counts the rows remaining
+    past the cursor.
+    """
+    if before_created_at is not None and before_id is not None:
+        query = query.filter(
+            tuple_(models.ActivityLog.created_at, models.ActivityLog.id)
+            < tuple_(before_created_at, before_id)
+        )
+        skip = 0
+
+    rows = (
+        query.with_entities(models.ActivityLog, func.count().over())
+        .order_by(models.ActivityLog.created_at.desc(),
+                  models.ActivityLog.id.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    if rows:
+        return [row[0] for row in rows], rows[0][1]
+    return [], query.count()
+
+
+def _my_logs_stmt(use_cursor: bool):
+    """Cached-by-structure statement for the default own-logs page.
+
+    lambda_stmt skips rebuilding the select() expression tree per
+    request; only the bound parameters change between calls.
+    """
+    stmt = lambda_stmt(
+        lambda: select(models.ActivityLog)
+        .where(models.ActivityLog.user_id == bindparam("uid"))
+    )
+    if use_cursor:
+        stmt += lambda s: s.where(
+            tuple_(models.ActivityLog.created_at, models.ActivityLog.id)
+            < tuple_(bindparam("before_created_at"), bindparam("before_id"))
+        )
+    stmt += lambda s: s.order_by(
+        models.ActivityLog.created_at.desc(),
+        models.ActivityLog.id.desc(),
+    ).limit(bindparam("lim")).offset(bindparam("off"))
+    return stmt
+
+
 @router.get("/me", response_model=schemas.ActivityLogListResponse)
 def read_my_activity_logs(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 50,
+    before_created_at: Optional[datetime.datetime] = None,
+    before_id: Optional[int] = None,
+    return_exact_count: bool = False,
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get current user's own activity logs.
+
+    Pass the last row's created_at/id as before_created_at/before_id to
+    page by keyset instead of offset. By default only has_more is
+    returned — counting a heavy user's whole log partition just to show
+    a page number is the most expensive part of this endpoint; pass
+    return_exact_count=true when the total is actually needed.
     """
-    logs = (
-        db.query(models.ActivityLog)
-        .filter(models.ActivityLog.user_id == current_user.id)
-        .order_by(models.ActivityLog.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    total = db.query(models.ActivityLog).filter(
+    query = db.query(models.ActivityLog).filter(
         models.ActivityLog.user_id == current_user.id
-    ).count()
-    
+    )
+
+    if not return_exact_count:
+        use_cursor = before_created_at is not None and before_id is not None
+        params = {
+            "uid": current_user.id,
+            "lim": limit,
+            "off": 0 if use_cursor else skip,
+        }
+        if use_cursor:
+            params["before_created_at"] = before_created_at
+            params["before_id"] = before_id
+        logs = db.execute(_my_logs_stmt(use_cursor), params).scalars().all()
+        return {"logs": logs, "has_more": len(logs) == limit}
+
+    logs, total = _page_with_total(query, skip, limit,
+                                   before_created_at, before_id)
+
     return {"logs": logs, "total": total}
 
 
@@ -40,7 +115,9 @@ def read_activity_logs(
     limit: int = 50,
     user_id: int = None,
     action: str = None,
-    current_user: models.User = Depends(deps.get_current_node_admin_or_higher),
+    before_created_at: Optional[datetime.datetime] = None,
+    before_id: Optional[int] = None,
+    current_user: models.User = Depends(deps.get_current_node_admin_or_higher_direct),
 ) -> Any:
     """
     List activity logs based on role:
@@ -54,31 +131,36 @@ def read_activity_logs(
         if user_id:
             query = query.filter(models.ActivityLog.user_id == user_id)
     else:
-        # Node Admin: Get Site Admins under their nodes + own logs
+        # Node Admin: Site Admins under their nodes + own logs. Kept as
+        # a subquery so the allowed IDs never round-trip through Python
+        # and the Site.node_id index does the work in one statement
         node_ids = [n.id for n in current_user.nodes]
-        site_admin_ids = (
-            db.query(models.User.id)
+        site_admins = (
+            select(models.User.id)
             .join(models.Site, models.User.id == models.Site.admin_id)
-            .filter(models.Site.node_id.in_(node_ids))
-            .filter(models.User.role == models.UserRole.SITE_ADMIN)
-            .distinct()
-            .all()
+            .where(models.Site.node_id.in_(node_ids))
+            .where(models.User.role == models.UserRole.SITE_ADMIN)
         )
-        allowed_user_ids = [current_user.id] + [u.id for u in site_admin_ids]
-        
+
         if user_id:
-            if user_id not in allowed_user_ids:
+            allowed = user_id == current_user.id or db.query(
+                site_admins.where(models.User.id == user_id).exists()
+            ).scalar()
+            if not allowed:
                 raise HTTPException(status_code=403, detail="Cannot view this user's logs")
             query = query.filter(models.ActivityLog.user_id == user_id)
         else:
-            query = query.filter(models.ActivityLog.user_id.in_(allowed_user_ids))
+            query = query.filter(or_(
+                models.ActivityLog.user_id == current_user.id,
+                models.ActivityLog.user_id.in_(site_admins),
+            ))
     
     if action:
         query = query.filter(models.ActivityLog.action == action)
     
-    logs = query.order_by(models.ActivityLog.created_at.desc()).offset(skip).limit(limit).all()
-    total = query.count()
-    
+    logs, total = _page_with_total(query, skip, limit,
+                                   before_created_at, before_id)
+
     return {"logs": logs, "total": total}
 
 
@@ -88,14 +170,22 @@ def read_user_activity_logs(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 50,
-    current_user: models.User = Depends(deps.get_current_node_admin_or_higher),
+    before_created_at: Optional[datetime.datetime] = None,
+    before_id: Optional[int] = None,
+    current_user: models.User = Depends(deps.get_current_node_admin_or_higher_direct),
 ) -> Any:
     """
     Get specific user's logs:
     - Super Admin: Any user
     - Node Admin: Site Admins on their nodes only
     """
-    target_user = db.query(models.User).filter(models.User.id == user_id).first()
+    # Only id/role are consulted for the access check below
+    target_user = (
+        db.query(models.User)
+        .options(load_only(models.User.id, models.User.role))
+        .filter(models.User.id == user_id)
+        .first()
+    )
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -118,16 +208,14 @@ def read_user_activity_logs(
         else:
             raise HTTPException(status_code=403, detail="Cannot view this user's logs")
     
-    logs = (
-        db.query(models.ActivityLog)
-        .filter(models.ActivityLog.user_id == user_id)
-        .order_by(models.ActivityLog.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    logs, total = _page_with_total(
+        db.query(models.ActivityLog).filter(
+            models.ActivityLog.user_id == user_id
+        ),
+        skip,
+        limit,
+        before_created_at,
+        before_id,
     )
-    total = db.query(models.ActivityLog).filter(
-        models.ActivityLog.user_id == user_id
-    ).count()
-    
+
     return {"logs": logs, "total": total}
@@ -4,6 +4,9 @@ import logging
 import random
 import string
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
+from jose import jwt, JWTError
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from master import schemas
@@ -11,58 +14,77 @@ from master.api import deps
 from master.core import security
 from master.db import models
 from master.core.config import get_settings
-from master.core.activity_logger import log_action, get_client_ip
-from master.core.turnstile import verify_turnstile_token, get_turnstile_secret, is_turnstile_enabled
+from master.core.activity_logger import LogContext, get_log_context, log_action
+from master.core.turnstile import verify_turnstile_token, get_turnstile_config
 from master.core.rate_limiter import limiter
 from master.core.communications.manager import ChannelManager
+from master.core.communications import send_message
+from master.core.communications.code_generator import generate_magic_link_token
+from master.core.communications.templates import render_magic_link_email, render_mfa_email
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 settings = get_settings()
 
+# Verified against when the username doesn't exist, so missing and
+# existing accounts take the same hashing time; derived once at import
+_DUMMY_HASH = security.get_password_hash("invalid")
+
 @router.post("/login", response_model=schemas.Token)
 @limiter.limit("5/minute")
 async def login_access_token(
     request: Request,
     login_data: schemas.LoginRequest,
     db: Session = Depends(deps.get_db),
+    log_context: LogContext = Depends(get_log_context),
 ) -> Any:
     """
     JSON token login, get an access token for future requests.
     """
-    logger.info(f"[LOGIN] Login attempt for: {login_data.username}")
+    logger.debug("[LOGIN] Login attempt for: %s", login_data.username)
     
     # Verify Turnstile if enabled
-    if is_turnstile_enabled(db):
-        secret = get_turnstile_secret(db)
+    turnstile_enabled, secret = get_turnstile_config(db)
+    if turnstile_enabled:
         if secret:
-            client_ip = get_client_ip(request)
             if not login_data.turnstile_token:
                 log_action(
                     action=models.ActionType.LOGIN_FAILED,
-                    request=request,
+                    context=log_context,
                     user_email=login_data.username,
                     details={"reason": "missing_turnstile_token"},
                 )
                 raise HTTPException(status_code=400, detail="Turnstile verification required")
             
-            if not verify_turnstile_token(login_data.turnstile_token, secret, client_ip):
+            if not verify_turnstile_token(login_data.turnstile_token, secret, log_context.ip_address):
                 log_action(
                     action=models.ActionType.LOGIN_FAILED,
-                    request=request,
+                    context=log_context,
                     user_email=login_data.username,
                     details={"reason": "invalid_turnstile_token"},
                 )
                 raise HTTPException(status_code=400, detail="Turnstile verification failed")
     
     user = db.query(models.User).filter(models.User.email == login_data.username).first()
-    if not user or not security.verify_password(login_data.password, user.hashed_password):
+    # Hashing takes tens of milliseconds; run it on the threadpool so
+    # this async handler doesn't stall the event loop for the duration
+    if user:
+        password_ok = await run_in_threadpool(
+            security.verify_password, login_data.password, user.hashed_password
+        )
+    else:
+        # Burn the same hashing cost for unknown usernames
+        await run_in_threadpool(
+            security.verify_password, login_data.password, _DUMMY_HASH
+        )
+        password_ok = False
+    if not password_ok:
         # Use unified error message to prevent enumeration
-        logger.warning(f"[LOGIN] Failed login attempt for: {login_data.username}")
+        logger.warning("[LOGIN] Failed login attempt for: %s", login_data.username)
         log_action(
             action=models.ActionType.LOGIN_FAILED,
-            request=request,
+            context=log_context,
             user_email=login_data.username,
             details={"reason": "invalid_credentials"},
         )
@@ -70,7 +92,7 @@ async def login_access_token(
     
     if not user.is_active:
         # Unified error messages
-        logger.warning(f"[LOGIN] Inactive user attempted login: {login_data.username}")
+        logger.warning("[LOGIN] Inactive user attempted login: %s", login_data.username)
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     # MFA Check
@@ -100,7 +122,6 @@ async def login_access_token(
                 # Get provider and send directly
                 provider = comm_manager.get_provider(channel)
                 if provider:
-                    from master.core.communications.templates import render_mfa_email
                     subject, html, body = render_mfa_email(otp, user.full_name)
                     
                     await provider.send(
@@ -111,14 +132,14 @@ async def login_access_token(
                         template_data={"otp": otp}
                     )
                 else:
-                    logger.error(f"[MFA] No provider found for channel {channel.name}")
+                    logger.error("[MFA] No provider found for channel %s", channel.name)
                     raise HTTPException(status_code=500, detail="MFA configuration error: Invalid provider")
             else:
-                 logger.error(f"[MFA] No channel found for user {user.id}")
+                 logger.error("[MFA] No channel found for user %s", user.id)
                  raise HTTPException(status_code=500, detail="MFA configuration error: No sending channel")
 
         except Exception as e:
-            logger.error(f"[MFA] Failed to send OTP: {e}")
+            logger.error("[MFA] Failed to send OTP: %s", e)
             raise HTTPException(status_code=500, detail="Failed to send verification code")
 
         # Create temporary MFA token
@@ -145,10 +166,10 @@ async def login_access_token(
     
     # Check if user email is verified
     if not user.is_verified:
-        logger.warning(f"[LOGIN] Unverified user attempted login: {login_data.username}")
+        logger.warning("[LOGIN] Unverified user attempted login: %s", login_data.username)
         log_action(
             action=models.ActionType.LOGIN_FAILED,
-            request=request,
+            context=log_context,
             user=user,
             details={"reason": "email_not_verified"},
         )
@@ -175,13 +196,13 @@ async def login_access_token(
         expires_delta=access_token_expires,
     )
     
-    logger.info(f"[LOGIN] Token created successfully for: {user.email} (role: {user.role})")
+    logger.info("[LOGIN] Token created successfully for: %s (role: %s)", user.email, user.role)
     
     # Log successful login (non-blocking)
     log_action(
         action=models.ActionType.LOGIN,
         user=user,
-        request=request,
+        context=log_context,
         details={"role": str(user.role)},
     )
     
@@ -201,16 +222,12 @@ async def request_magic_link(
     """
     Request a magic link for passwordless login.
     """
-    from datetime import datetime
-    from master.core.communications.code_generator import generate_magic_link_token
-    from master.core.communications import send_message
-    from master.core.communications.templates import render_magic_link_email
     
     user = db.query(models.User).filter(models.User.email == magic_link_data.email).first()
     
     # Always return success to prevent email enumeration
     if not user or not user.is_active:
-        logger.info(f"[MAGIC_LINK] No valid user for: {magic_link_data.email}")
+        logger.debug("[MAGIC_LINK] No valid user for: %s", magic_link_data.email)
         return schemas.MagicLinkResponse(
             success=True,
             message="If the email exists, a login link will be sent.",
@@ -239,7 +256,7 @@ async def request_magic_link(
     )
     
     if not result.success:
-        logger.error(f"[MAGIC_LINK] Failed to send email: {result.error}")
+        logger.error("[MAGIC_LINK] Failed to send email: %s", result.error)
     
     return schemas.MagicLinkResponse(
         success=True,
@@ -256,39 +273,43 @@ def login_with_magic_link(
     """
     Login using a magic link token.
     """
-    from datetime import datetime
-    
-    user = db.query(models.User).filter(
-        models.User.magic_link_token == token,
+
+    # Validate and consume the token atomically: the WHERE clause covers
+    # expiry, so one UPDATE replaces the SELECT-check-mutate-commit flow
+    # and closes the window where two clicks could both pass validation.
+    # Marking verified is safe here; the link proves email ownership.
+    user = db.execute(
+        update(models.User)
+        .where(
+            models.User.magic_link_token == token,
+            models.User.magic_link_expires > datetime.utcnow(),
+        )
+        .values(
+            magic_link_token=None,
+            magic_link_expires=None,
+            is_verified=True,
+        )
+        .returning(models.User.id, models.User.email, models.User.role,
+                   models.User.is_active)
     ).first()
-    
-    if not user:
+
+    if user is None:
+        db.rollback()
         raise HTTPException(status_code=400, detail="Invalid or expired login link")
-    
-    if not user.magic_link_expires or user.magic_link_expires < datetime.utcnow():
-        raise HTTPException(status_code=400, detail="Login link has expired")
-    
+
+    db.commit()
+
     if not user.is_active:
         raise HTTPException(status_code=400, detail="User account is inactive")
-    
-    # Clear magic link token
-    user.magic_link_token = None
-    user.magic_link_expires = None
-    
-    # Mark as verified if not already (magic link confirms email ownership)
-    if not user.is_verified:
-        user.is_verified = True
-    
-    db.commit()
-    
+
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
         data={"sub": user.email, "role": user.role},
         expires_delta=access_token_expires,
     )
-    
-    logger.info(f"[MAGIC_LINK] Login successful for: {user.email}")
+
+    logger.info("[MAGIC_LINK] Login successful for: %s", user.email)
     log_action(
         action=models.ActionType.LOGIN,
         user=user,
@@ -315,8 +336,6 @@ def verify_email_public(
     Public endpoint for users to verify their email after login attempt.
     Requires verification token from login 403 response.
     """
-    from datetime import datetime
-    from jose import jwt, JWTError
     
     # Check if token is in body (preferred) or query
     verification_token = verify_request.token or token
@@ -358,7 +377,7 @@ def verify_email_public(
     user.email_verification_expires = None
     db.commit()
     
-    logger.info(f"[VERIFY] Email verified for: {user.email}")
+    logger.info("[VERIFY] Email verified for: %s", user.email)
     log_action(
         action=models.ActionType.PROFILE_UPDATE,
         user=user,
@@ -380,8 +399,6 @@ def verify_mfa(
     Verify MFA OTP and return access token.
     If scope is 'mfa_setup', also enables MFA for the user.
     """
-    from jose import jwt, JWTError
-    from datetime import datetime
     
     if not verify_request.mfa_token:
         raise HTTPException(status_code=400, detail="Missing MFA token")
@@ -419,7 +436,7 @@ def verify_mfa(
     # Enable MFA if this was a setup flow
     if scope == "mfa_setup":
         user.mfa_enabled = True
-        logger.info(f"[MFA] Enabled for user {user.email}")
+        logger.info("[MFA] Enabled for user %s", user.email)
         log_action(
             action=models.ActionType.PROFILE_UPDATE,
             user=user,
@@ -470,7 +487,6 @@ async def enable_mfa(
         comm_manager = ChannelManager(db)
         provider = comm_manager.get_provider(channel)
         if provider:
-            from master.core.communications.templates import render_mfa_email
             # For setup confirmation
             subject_, html, body = render_mfa_email(otp, current_user.full_name)
             
@@ -485,7 +501,7 @@ async def enable_mfa(
             raise HTTPException(status_code=500, detail="Invalid channel provider")
             
     except Exception as e:
-        logger.error(f"[MFA] Setup failed to send OTP: {e}")
+        logger.error("[MFA] Setup failed to send OTP: %s", e)
         raise HTTPException(status_code=500, detail="Failed to send verification code")
     
     # Return Setup Token
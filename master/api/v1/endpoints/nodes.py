@@ -5,6 +5,7 @@ from master import schemas
 from master.api import deps
 from master.db import models
 from master.core.activity_logger import log_action
+import hashlib
 import secrets
 import uuid
 
@@ -51,6 +52,7 @@ def request_join(
         hostname=node_in.hostname,
         ip_address=node_in.ip_address,
         api_key=api_key,
+        api_key_hash=hashlib.sha256(api_key.encode()).hexdigest(),
         registration_code=registration_code,
         status=models.NodeStatus.PENDING,
         storage_quota_gb=0  # Start at 0, admin allocates later
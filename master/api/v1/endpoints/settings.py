@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from master import schemas
 from master.api import deps
 from master.db import models
+from master.core import turnstile
 from master.core.activity_logger import log_action
 
 router = APIRouter()
@@ -74,7 +75,11 @@ def update_setting(
     
     db.commit()
     db.refresh(setting)
-    
+
+    # Turnstile reads are served from a short TTL cache on the login path
+    if key.startswith("turnstile"):
+        turnstile.invalidate_cache()
+
     # Log the change
     log_action(
         action=models.ActionType.PROFILE_UPDATE,  # Reusing for settings
@@ -12,7 +12,7 @@ def get_node_by_api_key(
     x_api_key: str = Header(...),
     db: Session = Depends(deps.get_db)
 ) -> models.Node:
-    node = db.query(models.Node).filter(models.Node.api_key == x_api_key).first()
+    node = deps.lookup_node_by_key(db, x_api_key)
     if not node:
         raise HTTPException(status_code=403, detail="Invalid API Key")
     return node
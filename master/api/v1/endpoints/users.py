@@ -1,10 +1,11 @@
 from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from master import schemas
 from master.api import deps
 from master.db import models
-from master.core import security
+from master.core import jwt_cache, security
 from master.core.activity_logger import log_action
 
 router = APIRouter()
@@ -58,7 +59,8 @@ def update_current_user(
     
     db.commit()
     db.refresh(current_user)
-    
+    jwt_cache.invalidate_user(current_user.email)
+
     # Log profile update
     log_action(
         action=models.ActionType.PROFILE_UPDATE,
@@ -145,7 +147,7 @@ async def create_user(
     # Create user with hashed password
     user = models.User(
         email=user_in.email,
-        hashed_password=security.get_password_hash(user_in.password),
+        hashed_password=await run_in_threadpool(security.get_password_hash, user_in.password),
         full_name=user_in.full_name,
         is_active=user_in.is_active,
         role=user_in.role,
@@ -284,6 +286,7 @@ def update_user(
     
     db.commit()
     db.refresh(user)
+    jwt_cache.invalidate_user(user.email)
     return user_to_response(user)
 
 
@@ -307,7 +310,9 @@ def delete_user(
     
     db.delete(user)
     db.commit()
-    
+    jwt_cache.invalidate_user(deleted_email)
+
+
     # Log user deletion
     log_action(
         action=models.ActionType.USER_DELETE,
@@ -349,9 +354,9 @@ def verify_email(
         raise HTTPException(status_code=400, detail="Invalid verification code")
     
     # Handle email change vs initial verification
+    old_email = user.email
     if user.pending_email:
         # Email change - update email
-        old_email = user.email
         user.email = user.pending_email
         user.pending_email = None
         message = f"Email changed from {old_email} to {user.email}"
@@ -359,13 +364,14 @@ def verify_email(
         # Initial verification
         user.is_verified = True
         message = "Email verified successfully"
-    
+
     # Clear verification fields
     user.email_verification_code = None
     user.email_verification_expires = None
-    
+
     db.commit()
-    
+    jwt_cache.invalidate_user(old_email)
+
     return schemas.VerifyEmailResponse(success=True, message=message)
 
 
@@ -444,21 +450,22 @@ def force_verify_email(
         )
     
     # Handle email change vs initial verification
+    old_email = user.email
     if user.pending_email:
-        old_email = user.email
         user.email = user.pending_email
         user.pending_email = None
         message = f"Email force-changed from {old_email} to {user.email}"
     else:
         user.is_verified = True
         message = "Email force-verified successfully"
-    
+
     # Clear verification fields
     user.email_verification_code = None
     user.email_verification_expires = None
-    
+
     db.commit()
-    
+    jwt_cache.invalidate_user(old_email)
+
     return schemas.VerifyEmailResponse(success=True, message=message)
 
 
@@ -503,7 +510,9 @@ def assign_nodes_to_user(
     # Update assignments
     user.assigned_nodes = nodes
     db.commit()
-    
+    jwt_cache.invalidate_user(user.email)
+
+
     log_action(
         action=models.ActionType.USER_UPDATE,
         user=current_superuser,
@@ -540,7 +549,9 @@ def remove_node_from_user(
     if node in user.assigned_nodes:
         user.assigned_nodes.remove(node)
         db.commit()
-    
+        jwt_cache.invalidate_user(user.email)
+
+
     return None
 
 
@@ -585,7 +596,9 @@ def assign_sites_to_user(
     # Update assignments
     user.assigned_sites = sites
     db.commit()
-    
+    jwt_cache.invalidate_user(user.email)
+
+
     log_action(
         action=models.ActionType.USER_UPDATE,
         user=current_superuser,
@@ -622,5 +635,7 @@ def remove_site_from_user(
     if site in user.assigned_sites:
         user.assigned_sites.remove(site)
         db.commit()
-    
+        jwt_cache.invalidate_user(user.email)
+
+
     return None
@@ -1,9 +1,16 @@
 """
 Activity Logger - Non-blocking logging utility for tracking user actions.
 Handles Cloudflare-aware IP detection and auto-cleanup for retention.
+
+Events are enqueued and written by a single background worker in small
+batches, so a burst of logins costs one INSERT statement and one commit
+per batch instead of one thread + transaction per event.
 """
 import json
+import queue
 import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 from fastapi import Request
@@ -14,6 +21,15 @@ from master.db.session import SessionLocal
 # Maximum logs to keep per user
 MAX_LOGS_PER_USER = 100
 
+# Batch tuning for the background writer: flush whatever arrived within
+# the window, or earlier once a full batch is queued
+BATCH_MAX_EVENTS = 500
+BATCH_WINDOW_SECONDS = 0.1
+
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_worker_lock = threading.Lock()
+_worker_started = False
+
 
 def get_client_ip(request: Request) -> str:
     """
@@ -54,6 +70,22 @@ def get_user_agent(request: Request) -> str:
     return request.headers.get("User-Agent", "unknown")[:500]  # Limit length
 
 
+@dataclass(frozen=True)
+class LogContext:
+    """Client info extracted once per request instead of per log_action call."""
+    ip_address: str
+    user_agent: str
+
+
+def get_log_context(request: Request) -> LogContext:
+    """FastAPI dependency: prebuild the client context for log_action.
+
+    Endpoints with several logging branches (login has four) pass this
+    instead of the Request so header parsing happens once.
+    """
+    return LogContext(get_client_ip(request), get_user_agent(request))
+
+
 def _cleanup_old_logs(db: Session, user_id: int):
     """Remove old logs keeping only the most recent MAX_LOGS_PER_USER."""
     if not user_id:
@@ -76,47 +108,68 @@ def _cleanup_old_logs(db: Session, user_id: int):
     db.commit()
 
 
-def _log_action_sync(
-    user_id: Optional[int],
-    user_email: Optional[str],
-    action: models.ActionType,
-    target_type: Optional[str] = None,
-    target_id: Optional[int] = None,
-    target_name: Optional[str] = None,
-    details: Optional[dict] = None,
-    ip_address: Optional[str] = None,
-    user_agent: Optional[str] = None,
-):
-    """Synchronous logging function that runs in a separate thread."""
+def _write_batch(events: list):
+    """Insert a batch of queued events in one transaction."""
     try:
         db = SessionLocal()
-        
-        log_entry = models.ActivityLog(
-            user_id=user_id,
-            user_email=user_email,
-            action=action,
-            target_type=target_type,
-            target_id=target_id,
-            target_name=target_name,
-            details=json.dumps(details) if details else None,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            created_at=datetime.utcnow(),
-        )
-        
-        db.add(log_entry)
-        db.commit()
-        
-        # Cleanup old logs for this user
-        if user_id:
-            _cleanup_old_logs(db, user_id)
-        
-        db.close()
+        try:
+            db.bulk_insert_mappings(models.ActivityLog, events)
+            db.commit()
+
+            # Cleanup old logs once per user in the batch
+            for user_id in {e["user_id"] for e in events if e["user_id"]}:
+                _cleanup_old_logs(db, user_id)
+        finally:
+            db.close()
     except Exception as e:
         # Silent failure - don't affect main request
         print(f"[ActivityLog] Error logging action: {e}")
 
 
+def _drain_batch() -> list:
+    """Block for the next event, then soak up the rest of the window."""
+    events = [_queue.get()]
+    deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+    while len(events) < BATCH_MAX_EVENTS:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            events.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return events
+
+
+def _worker():
+    while True:
+        _write_batch(_drain_batch())
+
+
+def _ensure_worker():
+    global _worker_started
+    if _worker_started:
+        return
+    with _worker_lock:
+        if not _worker_started:
+            threading.Thread(
+                target=_worker, name="activity-log-writer", daemon=True
+            ).start()
+            _worker_started = True
+
+
+def flush_on_shutdown():
+    """Write any still-queued events; wire to the app shutdown hook."""
+    events = []
+    while True:
+        try:
+            events.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    if events:
+        _write_batch(events)
+
+
 def log_action(
     action: models.ActionType,
     user: Optional[models.User] = None,
@@ -127,10 +180,11 @@ def log_action(
     details: Optional[dict] = None,
     ip_address: Optional[str] = None,
     user_email: Optional[str] = None,
+    context: Optional[LogContext] = None,
 ):
     """
     Non-blocking activity logging.
-    
+
     Usage:
         log_action(
             action=ActionType.LOGIN,
@@ -138,9 +192,16 @@ def log_action(
             request=request,
             details={"success": True}
         )
+
+    Pass context (from the get_log_context dependency) instead of
+    request when logging from multiple branches of one endpoint.
     """
-    # Extract info from request if provided
-    if request:
+    # Prebuilt context wins; otherwise extract from request if provided
+    if context:
+        if not ip_address:
+            ip_address = context.ip_address
+        user_agent = context.user_agent
+    elif request:
         if not ip_address:
             ip_address = get_client_ip(request)
         user_agent = get_user_agent(request)
@@ -152,20 +213,17 @@ def log_action(
     if not user_email and user:
         user_email = user.email
     
-    # Run in background thread (non-blocking)
-    thread = threading.Thread(
-        target=_log_action_sync,
-        args=(
-            user_id,
-            user_email,
-            action,
-            target_type,
-            target_id,
-            target_name,
-            details,
-            ip_address,
-            user_agent,
-        ),
-        daemon=True,
-    )
-    thread.start()
+    # Enqueue for the batching worker (non-blocking)
+    _queue.put({
+        "user_id": user_id,
+        "user_email": user_email,
+        "action": action,
+        "target_type": target_type,
+        "target_id": target_id,
+        "target_name": target_name,
+        "details": json.dumps(details) if details else None,
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "created_at": datetime.utcnow(),
+    })
+    _ensure_worker()
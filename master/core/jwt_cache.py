@@ -0,0 +1,87 @@
+"""
+Bounded TTL cache for verified JWTs.
+
+Signature verification dominates auth CPU, but clients present the same
+bearer token for its entire lifetime. Cache the verified claims keyed by
+a SHA-256 digest of the raw token (never the token itself) for a short
+window so repeat requests skip jwt.decode; token expiry is still
+enforced on every hit.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+_MAX_ENTRIES = 10_000
+_TTL_SECONDS = 10
+
+# The resolved user is cached a little longer than the claims; entries
+# are dropped eagerly by invalidate_user when an update endpoint
+# touches the account
+_USER_TTL_SECONDS = 60
+
+_lock = threading.Lock()
+_cache: OrderedDict = OrderedDict()
+
+_user_lock = threading.Lock()
+_user_cache: OrderedDict = OrderedDict()
+
+
+def get_cached_claims(token: str):
+    """Return (email, exp) for a recently verified token, or None."""
+    key = hashlib.sha256(token.encode()).digest()
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        cached_at, email, exp = entry
+        if now - cached_at > _TTL_SECONDS:
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+    # Never serve a token past its own expiry, however fresh the entry
+    if exp is not None and exp <= time.time():
+        return None
+    return email, exp
+
+
+def cache_claims(token: str, email: str, exp) -> None:
+    """Record the claims of a token that just passed jwt.decode."""
+    key = hashlib.sha256(token.encode()).digest()
+    with _lock:
+        _cache[key] = (time.monotonic(), email, exp)
+        _cache.move_to_end(key)
+        while len(_cache) > _MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def get_cached_user(email: str):
+    """Return the recently loaded User for an email, or None."""
+    now = time.monotonic()
+    with _user_lock:
+        entry = _user_cache.get(email)
+        if entry is None:
+            return None
+        cached_at, user = entry
+        if now - cached_at > _USER_TTL_SECONDS:
+            del _user_cache[email]
+            return None
+        _user_cache.move_to_end(email)
+        return user
+
+
+def cache_user(email: str, user) -> None:
+    """Record the User just loaded for a verified token's email."""
+    with _user_lock:
+        _user_cache[email] = (time.monotonic(), user)
+        _user_cache.move_to_end(email)
+        while len(_user_cache) > _MAX_ENTRIES:
+            _user_cache.popitem(last=False)
+
+
+def invalidate_user(email: str) -> None:
+    """Drop a cached User after an account update (role, active flag, ...)."""
+    with _user_lock:
+        _user_cache.pop(email, None)
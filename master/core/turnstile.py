@@ -1,6 +1,9 @@
 """
 Cloudflare Turnstile verification utility.
 """
+import threading
+import time
+
 import httpx
 from sqlalchemy.orm import Session
 from master.db import models
@@ -8,17 +11,71 @@ from master.db import models
 
 TURNSTILE_VERIFY_URL = "https://challenges.cloudflare.com/turnstile/v0/siteverify"
 
+# Turnstile settings change rarely but are read on every login; a short
+# TTL cache keeps those reads off the database. update_setting clears
+# it so admin changes apply immediately.
+_CACHE_TTL_SECONDS = 30
+
+_cache_lock = threading.Lock()
+_cache: dict = {}  # settings key -> (cached_at, value)
+
+
+def _cached_setting(db: Session, key: str) -> str | None:
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry[0] <= _CACHE_TTL_SECONDS:
+            return entry[1]
+    setting = db.query(models.Settings).filter(models.Settings.key == key).first()
+    value = setting.value if setting else None
+    with _cache_lock:
+        _cache[key] = (now, value)
+    return value
+
+
+def invalidate_cache() -> None:
+    """Drop cached settings after an admin settings write."""
+    with _cache_lock:
+        _cache.clear()
+
+
+_CONFIG_KEYS = ("turnstile_enabled", "turnstile_secret")
+
+
+def get_turnstile_config(db: Session) -> tuple[bool, str | None]:
+    """Return (enabled, secret), fetching both settings in one query.
+
+    The login path needs both values; on a cold cache this warms them
+    with a single SELECT instead of one per key.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        entries = {k: _cache.get(k) for k in _CONFIG_KEYS}
+    if all(e is not None and now - e[0] <= _CACHE_TTL_SECONDS
+           for e in entries.values()):
+        values = {k: e[1] for k, e in entries.items()}
+    else:
+        values = dict.fromkeys(_CONFIG_KEYS)
+        rows = (
+            db.query(models.Settings.key, models.Settings.value)
+            .filter(models.Settings.key.in_(_CONFIG_KEYS))
+            .all()
+        )
+        values.update(dict(rows))
+        with _cache_lock:
+            for k, v in values.items():
+                _cache[k] = (now, v)
+    return values["turnstile_enabled"] == "true", values["turnstile_secret"]
+
 
 def get_turnstile_secret(db: Session) -> str | None:
     """Get Turnstile secret from settings."""
-    setting = db.query(models.Settings).filter(models.Settings.key == "turnstile_secret").first()
-    return setting.value if setting else None
+    return _cached_setting(db, "turnstile_secret")
 
 
 def is_turnstile_enabled(db: Session) -> bool:
     """Check if Turnstile is enabled."""
-    setting = db.query(models.Settings).filter(models.Settings.key == "turnstile_enabled").first()
-    return setting.value == "true" if setting else False
+    return _cached_setting(db, "turnstile_enabled") == "true"
 
 
 def verify_turnstile_token(token: str, secret: str, ip: str = None) -> bool:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Table
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Index, Table
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import enum
@@ -49,7 +49,15 @@ class MessageRole(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
-    
+
+    # Partial index: only rows with an outstanding magic link are
+    # indexed, so it stays tiny however large the table grows
+    __table_args__ = (
+        Index("ix_users_magic_link_token", "magic_link_token",
+              postgresql_where=Column("magic_link_token").isnot(None),
+              sqlite_where=Column("magic_link_token").isnot(None)),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
@@ -64,7 +72,7 @@ class User(Base):
     pending_email = Column(String, nullable=True)
 
     # Magic link login
-    magic_link_token = Column(String, nullable=True, index=True)
+    magic_link_token = Column(String, nullable=True)  # indexed partially, see __table_args__
     magic_link_expires = Column(DateTime, nullable=True)
 
     # MFA
@@ -94,6 +102,7 @@ class Node(Base):
     hostname = Column(String, index=True)
     ip_address = Column(String)
     api_key = Column(String, unique=True, index=True)  # For agent authentication
+    api_key_hash = Column(String(64), unique=True, index=True)  # sha256 hex of api_key; indexed auth lookup
     is_active = Column(Boolean, default=True)
     status = Column(Enum(NodeStatus), default=NodeStatus.PENDING)
     storage_quota_gb = Column(Integer, default=0)  # Start at 0 - tied to remote storage
@@ -207,7 +216,17 @@ class ActionType(str, enum.Enum):
 
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
-    
+
+    # Every log endpoint runs WHERE user_id = ? ORDER BY created_at DESC
+    # LIMIT n; the composite index lets the database walk it backwards
+    # and stop at the limit instead of filtering then sorting
+    __table_args__ = (
+        Index("ix_activity_logs_user_created", "user_id", "created_at"),
+        # Same walk for the action-filtered listing path
+        Index("ix_activity_logs_user_action_created",
+              "user_id", "action", "created_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     user_email = Column(String, nullable=True)  # Store email for lookup even if user deleted
@@ -4,11 +4,22 @@ from master.core.config import get_settings
 
 settings = get_settings()
 
+# pool_pre_ping revalidates pooled connections with a cheap ping so a
+# DB restart doesn't surface as request errors; pool_recycle stays under
+# typical server-side idle timeouts, and the Postgres statement timeout
+# stops a runaway query from pinning a pooled connection.
 engine = create_engine(
-    settings.DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
+    settings.DATABASE_URL,
+    connect_args=(
+        {"check_same_thread": False}
+        if "sqlite" in settings.DATABASE_URL
+        else {"options": "-c statement_timeout=5000"}
+    ),
     pool_size=20,
     max_overflow=40,
+    pool_timeout=5,
+    pool_pre_ping=True,
+    pool_recycle=1800,
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -104,6 +104,11 @@ async def startup_event():
     from master.core.scheduler import init_scheduler
     init_scheduler(app)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    from master.core.activity_logger import flush_on_shutdown
+    flush_on_shutdown()
+
 @app.get("/")
 def root():
     return {"message": "WordPress Backup Master API", "status": "running"}
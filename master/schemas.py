@@ -266,7 +266,8 @@ class ActivityLogResponse(BaseModel):
 
 class ActivityLogListResponse(BaseModel):
     logs: List[ActivityLogResponse]
-    total: int
+    total: Optional[int] = None  # None when the caller skipped the exact count
+    has_more: Optional[bool] = None
 
 # -- Settings Schemas --
 class SettingResponse(BaseModel):